@@ -11,10 +11,24 @@ __author__ = "Chen"
 __email__ = "cty889977@gmail.com"
 __description__ = "Intelligent Agent CLI - AI-powered command-line assistant with MCP integration"
 
-# Make key classes available at package level
-from .core.agent import IntelligentAgent
-from .core.model_loader import ModelConfigLoader
-from .core.memory_manager import MemoryManager
+# Make key classes available at package level. They are imported on first
+# attribute access so that importing the package (e.g. for the CLI) does not
+# pull in mcp, ollama and rich up front.
+_LAZY_EXPORTS = {
+    "IntelligentAgent": ".core.agent",
+    "ModelConfigLoader": ".core.model_loader",
+    "MemoryManager": ".core.memory_manager",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        import importlib
+        value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     "IntelligentAgent",
@@ -1,16 +1,29 @@
-from ollama_agent import IntelligentAgent, MemoryManager, ModelConfigLoader
+from __future__ import annotations
+
+from ollama_agent.core.memory_manager import MemoryManager
+from ollama_agent.core.model_loader import ModelConfigLoader
+from ollama_agent.core import json_compat
 import asyncio
+from contextlib import AsyncExitStack, redirect_stdout, suppress
 import ollama_agent
-from mcp.client.stdio import stdio_client
-from mcp import ClientSession, StdioServerParameters
 import os
 import sys
 import argparse
+import threading
 import difflib
+import hashlib
+import io
 import json
-import traceback
-from rich.console import Console
-from rich.markdown import Markdown
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Iterable, Iterator
+
+# rich, mcp and the agent are imported where they are used, so commands that
+# never touch them (--help, --memory, --model) start quickly.
+if TYPE_CHECKING:
+    from mcp import ClientSession, StdioServerParameters
+    from rich.console import Console
+    from rich.markdown import Markdown
+    from ollama_agent.core.agent import IntelligentAgent
 
 try:
     import dotenv
@@ -18,20 +31,25 @@ try:
 except ImportError:
     pass
 
-console = Console()
-isDebug:bool = IntelligentAgent.printDebug
+_console: Console | None = None
+isDebug:bool = os.getenv("DEBUG", "false").lower() == "true"
 # Create a single instance and reuse it
 loader = ModelConfigLoader()
 loadtinymodel = loader.get_model_name("tiny")  # Use the existing instance
 manager = MemoryManager()
 # loader already created above
-EXIT_COMMANDS = ['quit', 'exit', 'q', 'bye', 'goodbye']
-HELP_COMMANDS = ['help', '?']
+HISTORY_FILE = os.path.expanduser("~/.ollama_agent_history")
+TOOL_CACHE_FILE = os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "ollama_agent", "tools.json"
+)
+EXIT_COMMANDS = frozenset({'quit', 'exit', 'q', 'bye', 'goodbye'})
+HELP_COMMANDS = frozenset({'help', '?'})
+BATCH_SEPARATOR = ";;"
 
 ALL_COMMANDS =[
     '/memory clear', '/memory clear-all', '/memory view', '/memory stats',
     '/model summary', '/model models', '/model defaults', '/model config',
-    '/quit', '/exit', '/q', '/bye', '/goodbye', '/help', '/?'
+    '/batch', '/quit', '/exit', '/q', '/bye', '/goodbye', '/help', '/?'
 ]
 
 AVAILABLE_COMMANDS = """
@@ -47,6 +65,7 @@ Available commands:
 - '/model models' - List available models
 - '/model defaults' - Show default models
 - '/model config' - Show full configuration
+- '/batch <q1> ;; <q2> ;; ...' - Run several queries concurrently
 - Ctrl+C - Force exit
 
 Examples:
@@ -56,145 +75,624 @@ Examples:
 """
 
 
-def debug_print(debug_mode: bool = isDebug, message: str = "") -> None:
-    """Print debug messages if debug mode is enabled."""
+def get_console() -> Console:
+    """Return the shared rich Console, creating it on first use."""
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console()
+    return _console
+
+@lru_cache(maxsize=8)
+def render_markdown(text: str) -> Markdown:
+    """Parse text into a rich Markdown renderable; repeated responses reuse the parse."""
+    from rich.markdown import Markdown
+    return Markdown(text)
+
+def warm_up_renderer() -> None:
+    """
+    Render a small code block off-screen so rich loads its theme and the
+    Pygments lexers before the first real response is printed.
+    """
+    from rich.console import Console
+    from rich.markdown import Markdown
+    Console(file=io.StringIO()).print(Markdown("```python\npass\n```"), end="")
+
+def print_result(result: str) -> None:
+    """Render an agent response as Markdown."""
+    if not result:
+        print("No response from agent.")
+        return
+    get_console().print(render_markdown(result))
+
+def print_stream(chunks: Iterable[str]) -> None:
+    """Render response chunks as Markdown, updating the output as they arrive."""
+    from rich.live import Live
+    from rich.markdown import Markdown
+
+    text = ""
+    with Live(console=get_console(), refresh_per_second=8) as live:
+        for chunk in chunks:
+            text += chunk
+            # Every partial text is new, so render_markdown's cache would only be churned here
+            live.update(Markdown(text))
+    if not text:
+        print("No response from agent.")
+
+def debug_print(debug_mode: bool = isDebug, message: str | Callable[[], str] = "") -> None:
+    """
+    Print debug messages if debug mode is enabled.
+
+    message may be a zero-argument callable returning the text, so expensive
+    formatting is skipped entirely when debug mode is off.
+    """
     if debug_mode:
-        print(f"[DEBUG] {message}")
+        print(f"[DEBUG] {message() if callable(message) else message}")
 
-async def run_intelligent_agent(userquery) -> str:
+def get_server_params() -> dict[str, StdioServerParameters]:
     """
-    Main function to run the intelligent agent that decides when to search.
+    Return the MCP servers to start, keyed by a short server name.
+
+    Additional tool servers (filesystem, github, notes, ...) only need an entry
+    here; MCPHost starts them together and merges their tools.
     """
-    
+    from mcp import StdioServerParameters
+
     # Get absolute path to server and use the virtual environment Python
     package_dir = os.path.dirname(ollama_agent.__file__)
     server_path = os.path.join(package_dir, "server", "mcp_server.py")
     python_path = sys.executable  # Use current Python interpreter
-    params = StdioServerParameters(command=python_path, args=[server_path])
-    
+    # Unbuffered stdio gets each JSON-RPC reply onto the pipe immediately. The
+    # server imports mcp/requests from site-packages, so -S is not an option.
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    return {
+        "main": StdioServerParameters(command=python_path, args=["-u", server_path], env=env),
+    }
+
+
+# Built tool schemas keyed by a content hash of the tools they were built from
+_TOOL_DEFS_CACHE: dict[bytes, tuple[list[dict], str]] = {}
+
+def _tools_key(tools: tuple) -> bytes:
+    """Stable content hash of the tool names, descriptions and input schemas."""
+    payload = json.dumps(
+        [(tool.name, tool.description, tool.inputSchema) for tool in tools],
+        sort_keys=True,
+    )
+    return hashlib.blake2b(payload.encode("utf-8")).digest()
+
+def build_tool_defs(tools: tuple) -> tuple[list[dict], str]:
+    """
+    Convert MCP tools into Ollama "tools" definitions and a human-readable list.
+
+    Tool schemas are static per server, so results are memoized by content hash
+    and the same tools are only converted once per process. Callers must treat
+    the returned definitions as read-only.
+    """
+    key = _tools_key(tools)
+    cached = _TOOL_DEFS_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    tool_defs = []  # <-- final list in Ollama-compatible format
+    tool_list_items = []
+
+    for i, tool in enumerate(tools):
+        # Build parameters schema
+        parameters = {
+            "type": "object",
+            "properties": {}
+        }
+        required_args = []
+        arg_items = []
+
+        schema = tool.inputSchema or {}
+        required = schema.get("required", ())
+        # Single pass builds the schema properties, required list and arg list
+        for arg_name, arg_info in schema.get("properties", {}).items():
+            parameters["properties"][arg_name] = {
+                "type": arg_info.get("type", "string"),
+                "description": arg_info.get("description", "")
+            }
+            if arg_name in required:
+                required_args.append(arg_name)
+            arg_items.append(f"{arg_name} ({arg_info.get('type', 'unknown')})")
+
+        if required_args:
+            parameters["required"] = required_args
+
+        # Wrap each tool as Ollama-compatible "tools" schema
+        tool_defs.append({
+            "type": "function",
+            "function": {
+                "name": tool.name,
+                "description": tool.description,
+                "parameters": parameters
+            }
+        })
+
+        # Append to human-readable tool list
+        tool_list_items.append(f"{i+1}. {tool.name} : {tool.description}\n   Args: {', '.join(arg_items)}")
+
+    result = (tool_defs, "\n".join(tool_list_items))
+    _TOOL_DEFS_CACHE[key] = result
+    return result
+
+
+def tool_cache_key(servers: dict[str, StdioServerParameters]) -> str | None:
+    """
+    Key the on-disk tool cache by the mtime and size of each server script.
+
+    Returns None when a server is not launched from a local script, in which
+    case its tools cannot be assumed static and the disk cache is not used.
+    """
+    parts = []
+    for name, params in servers.items():
+        script = params.args[-1] if params.args else ""
+        if not os.path.isfile(script):
+            return None
+        st = os.stat(script)
+        parts.append(f"{name}:{st.st_mtime_ns}-{st.st_size}")
+    return "|".join(parts)
+
+def load_tool_cache(key: str) -> dict | None:
+    """Return the cached tool schema for key, or None on a miss."""
     try:
-        async with stdio_client(params) as (r,w):
-            async with ClientSession(r,w) as sess:
-                await sess.initialize()
-                
-                tools = await sess.list_tools()
-
-                tool_defs = []  # <-- final list in Ollama-compatible format
-                tool_list_items = []
-
-                for i, tool in enumerate(tools.tools):
-                    # Build parameters schema
-                    parameters = {
-                        "type": "object",
-                        "properties": {}
-                    }
-
-                    arg_info: dict
-
-                    required_args = []
-                    if tool.inputSchema and "properties" in tool.inputSchema:
-                        for arg_name, arg_info in tool.inputSchema["properties"].items():
-                            # Add each argument into properties
-                            parameters["properties"][arg_name] = {
-                                "type": arg_info.get("type", "string"),
-                                "description": arg_info.get("description", "")
-                            }
-                            # If schema marks as required, include it
-                            if "required" in tool.inputSchema and arg_name in tool.inputSchema["required"]:
-                                required_args.append(arg_name)
-
-                    if required_args:
-                        parameters["required"] = required_args
-
-                    # Wrap each tool as Ollama-compatible "tools" schema
-                    tool_defs.append({
-                        "type": "function",
-                        "function": {
-                            "name": tool.name,
-                            "description": tool.description,
-                            "parameters": parameters
-                        }
-                    })
-
-                    # Append to human-readable tool list
-                    arg_list = ", ".join([
-                        f"{arg_name} ({arg_info.get('type', 'unknown')})"
-                        for arg_name, arg_info in (tool.inputSchema['properties'].items() if tool.inputSchema else {})
-                    ])
-                    tool_list_items.append(f"{i+1}. {tool.name} : {tool.description}\n   Args: {arg_list}")
-
-                debug_print(message=f"Tool definitions: {tool_defs}")
-                tool_list = "\n".join(tool_list_items)
-                debug_print(message=f"Available tools:\n{tool_list}")
-                intelligentAgent = IntelligentAgent(list_of_tools=tool_list, avaliable_functions=tool_defs)
-                result = await intelligentAgent.handle_user_query(user_query=userquery, mcp_session=sess)
-                return result
-                    
-    except Exception as e:
-        error_msg = f"Error running intelligent agent: {e}"
-        debug_print(message=error_msg)
-        traceback.print_exc()
-        return error_msg
-    
+        with open(TOOL_CACHE_FILE, 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cached if isinstance(cached, dict) and cached.get("key") == key else None
+
+def save_tool_cache(key: str, tool_defs: list[dict], tool_list: str, routes: dict[str, str]) -> None:
+    """Persist the built tool schema; failures only disable the cache."""
+    try:
+        os.makedirs(os.path.dirname(TOOL_CACHE_FILE), exist_ok=True)
+        tmp_path = f"{TOOL_CACHE_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"key": key, "defs": tool_defs, "list": tool_list, "routes": routes}, f)
+        os.replace(tmp_path, TOOL_CACHE_FILE)
+    except OSError as e:
+        debug_print(message=f"Could not write tool cache: {e}")
+
+
+class MCPHost:
+    """
+    Host for several MCP stdio servers sharing a single AsyncExitStack.
+
+    Tools from every server are merged into one registry and calls are routed to
+    the session that owns the tool, so the host can be passed anywhere a single
+    ClientSession is expected.
+    """
+
+    def __init__(self) -> None:
+        self.sessions: dict[str, ClientSession] = {}
+        self.tool_registry: dict[str, tuple[str, object]] = {}
+        self.tool_defs: list[dict] = []
+        self.tool_list: str = ""
+        self._exit_stack = AsyncExitStack()
+        self._closing = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+        self._cache_key: str | None = None
+        self._list_task: asyncio.Task | None = None
+
+    async def connect(self, name: str, params: StdioServerParameters) -> ClientSession:
+        """Spawn one server and open its session. The handshake runs in connect_all()."""
+        from mcp import ClientSession
+        from mcp.client.stdio import stdio_client
+
+        read, write = await self._exit_stack.enter_async_context(stdio_client(params))
+        session = await self._exit_stack.enter_async_context(ClientSession(read, write))
+        self.sessions[name] = session
+        return session
+
+    async def connect_all(self, servers: dict[str, StdioServerParameters]) -> None:
+        """
+        Start all servers and run their initialize handshakes in parallel.
+
+        The sessions are owned by a background task created here: the anyio task
+        groups inside stdio_client must be exited from the task that entered them,
+        and callers such as AsyncLoopThread.submit() run connect and close in
+        different tasks.
+        """
+        self._cache_key = tool_cache_key(servers)
+        self._closing = asyncio.Event()
+        ready = asyncio.get_running_loop().create_future()
+        self._runner = asyncio.create_task(self._serve(servers, ready))
+        await ready
+
+    async def _serve(self, servers: dict[str, StdioServerParameters], ready: asyncio.Future) -> None:
+        """Open every session, report readiness and hold the sessions until close()."""
+        try:
+            # Contexts are entered one by one in this task; only the handshakes,
+            # the slow part, run concurrently.
+            for name, params in servers.items():
+                await self.connect(name, params)
+
+            await asyncio.gather(*(session.initialize() for session in self.sessions.values()))
+        except BaseException as e:
+            await self._exit_stack.aclose()
+            if not ready.done():
+                ready.set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+
+        ready.set_result(None)
+        try:
+            await self._closing.wait()
+        finally:
+            await self._exit_stack.aclose()
+
+    async def refresh_tools(self, use_cache: bool = True) -> None:
+        """
+        Fetch the tools of every server in parallel and rebuild the merged registry.
+
+        When the server scripts are unchanged since the last run, the schema is
+        loaded from the disk cache so the agent can be built straight away, and
+        list_tools() runs in the background. It still has to run: call_tool()
+        validates results against the output schemas that list_tools() caches
+        in each session, and would otherwise issue the request itself.
+        """
+        if use_cache and self._cache_key is not None:
+            cached = load_tool_cache(self._cache_key)
+            if cached is not None:
+                self.tool_registry = {name: (server, None) for name, server in cached["routes"].items()}
+                self.tool_defs, self.tool_list = cached["defs"], cached["list"]
+                debug_print(message="Loaded tool definitions from cache")
+                self._list_task = asyncio.create_task(self._list_tools())
+                self._list_task.add_done_callback(self._report_list_error)
+                return
+
+        await self._list_tools()
+
+    async def _list_tools(self) -> None:
+        """Run list_tools() on every session and save the merged schema to the disk cache."""
+        names = list(self.sessions)
+        results = await asyncio.gather(*(self.sessions[name].list_tools() for name in names))
+
+        self.tool_registry.clear()
+        for name, tools in zip(names, results):
+            for tool in tools.tools:
+                if tool.name in self.tool_registry:
+                    debug_print(message=lambda: f"Tool '{tool.name}' from '{name}' overrides '{self.tool_registry[tool.name][0]}'")
+                self.tool_registry[tool.name] = (name, tool)
+
+        self._build_tool_defs()
+        if self._cache_key is not None:
+            routes = {tool_name: server for tool_name, (server, _) in self.tool_registry.items()}
+            save_tool_cache(self._cache_key, self.tool_defs, self.tool_list, routes)
+
+    @staticmethod
+    def _report_list_error(task: asyncio.Task) -> None:
+        """Log a failed background list_tools(); call_tool() then lists the tools on demand."""
+        if not task.cancelled() and task.exception() is not None:
+            debug_print(message=lambda: f"Background list_tools failed: {task.exception()}")
+
+    def _build_tool_defs(self) -> None:
+        """Build the Ollama-compatible tool schema and tool list once per host."""
+        tools = tuple(tool for _, tool in self.tool_registry.values())
+        self.tool_defs, self.tool_list = build_tool_defs(tools)
+        debug_print(message=lambda: f"Tool definitions: {self.tool_defs}")
+        debug_print(message=lambda: f"Available tools:\n{self.tool_list}")
+
+    async def call_tool(self, name: str, arguments: dict | None = None):
+        """Route a tool call to the session of the server that provides it."""
+        if name not in self.tool_registry:
+            raise ValueError(f"Unknown tool: {name}")
+        server_name, _ = self.tool_registry[name]
+        return await self.sessions[server_name].call_tool(name, arguments)
+
+    async def close(self) -> None:
+        """Close every session and terminate all server subprocesses."""
+        if self._list_task is not None and not self._list_task.done():
+            self._list_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._list_task
+        self._list_task = None
+        if self._runner is not None:
+            self._closing.set()
+            with suppress(asyncio.CancelledError):
+                await self._runner
+            self._runner = None
+        self.sessions.clear()
+        self.tool_registry.clear()
+
+
+class MCPClient:
+    """
+    Persistent MCP client that keeps its stdio sessions open across queries.
+
+    connect() spawns and initializes the servers; warmup() fetches the tools and
+    builds the agent. Interactive mode starts the warmup in the background so it
+    overlaps with the user typing; query() waits for it if it is still running.
+    """
+
+    def __init__(self) -> None:
+        self._host = MCPHost()
+        self.intelligentAgent: IntelligentAgent | None = None
+        self._warmup_task: asyncio.Task | None = None
+
+    @property
+    def tool_defs(self) -> list[dict]:
+        return self._host.tool_defs
+
+    @property
+    def tool_list(self) -> str:
+        return self._host.tool_list
+
+    async def connect(self) -> None:
+        """Start the MCP servers and perform the initialize handshakes."""
+        await self._host.connect_all(get_server_params())
+
+    async def warmup(self) -> None:
+        """Fetch the tool schemas and build the agent."""
+        from ollama_agent.core.agent import IntelligentAgent
+
+        await self._host.refresh_tools()
+        self.intelligentAgent = IntelligentAgent(list_of_tools=self.tool_list, avaliable_functions=self.tool_defs)
+
+    async def start_warmup(self) -> None:
+        """Schedule warmup() as a background task and return immediately."""
+        if self._warmup_task is None:
+            self._warmup_task = asyncio.create_task(self.warmup())
+
+    async def _ensure_ready(self) -> IntelligentAgent:
+        """Wait for the warmup, starting it if needed, and return the agent."""
+        await self.start_warmup()
+        try:
+            # Shielded so a cancelled query does not cancel the shared warmup
+            await asyncio.shield(self._warmup_task)
+        except Exception:
+            # Let the next query retry the warmup
+            self._warmup_task = None
+            raise
+        return self.intelligentAgent
+
+    async def query(self, userquery: str, batch_format: bool = False) -> str:
+        """Run a single query through the agent using the open sessions."""
+        agent = await self._ensure_ready()
+        return await agent.handle_user_query(user_query=userquery, mcp_session=self._host, batch_format=batch_format)
+
+    async def stream(self, userquery: str) -> AsyncIterator[str]:
+        """Like query(), but yield the response in chunks as they are produced."""
+        agent = await self._ensure_ready()
+        async for chunk in agent.stream_user_query(user_query=userquery, mcp_session=self._host):
+            yield chunk
+
+    async def query_many(self, queries: list[str]) -> list:
+        """
+        Run several queries concurrently over the same sessions.
+
+        Results keep the order of queries; a failed query yields its exception
+        instead of cancelling the others. Tool output is reformatted by the
+        small model, with the queries' formatting requests batched together.
+        """
+        return await asyncio.gather(*(self.query(q, batch_format=True) for q in queries), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Close the sessions and terminate the MCP server subprocesses."""
+        if self._warmup_task is not None and not self._warmup_task.done():
+            self._warmup_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._warmup_task
+        self._warmup_task = None
+        await self._host.close()
+        self.intelligentAgent = None
+
+
+class AsyncLoopThread(threading.Thread):
+    """
+    Daemon thread running one persistent asyncio event loop.
+
+    Synchronous callers hand coroutines to submit(), so the MCP sessions living
+    on this loop survive across queries instead of being torn down with a
+    per-call asyncio.run().
+    """
+
+    def __init__(self) -> None:
+        super().__init__(name="ollama-agent-loop", daemon=True)
+        self.loop = asyncio.new_event_loop()
+
+    def run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Run a coroutine on the loop and block until it returns."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result()
+        except KeyboardInterrupt:
+            # Cancel the task on the loop so Ctrl+C does not leave it running
+            future.cancel()
+            raise
+
+    def stop(self) -> None:
+        """Stop the loop and wait for the thread to finish."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join()
+        self.loop.close()
+
+
+async def _next_chunk(chunks: AsyncIterator[str]) -> str | None:
+    """Return the next chunk of an async iterator, or None when it is exhausted."""
+    try:
+        return await anext(chunks)
+    except StopAsyncIteration:
+        return None
+
+
+class MCPClientWrapper:
+    """Synchronous facade over an MCPClient running on an AsyncLoopThread."""
+
+    def __init__(self, loop_thread: AsyncLoopThread) -> None:
+        self._loop_thread = loop_thread
+        self._client = MCPClient()
+
+    def connect(self) -> None:
+        self._loop_thread.submit(self._client.connect())
+
+    def start_warmup(self) -> None:
+        self._loop_thread.submit(self._client.start_warmup())
+
+    def query(self, userquery: str) -> str:
+        return self._loop_thread.submit(self._client.query(userquery))
+
+    def query_many(self, queries: list[str]) -> list:
+        return self._loop_thread.submit(self._client.query_many(queries))
+
+    def stream(self, userquery: str) -> Iterator[str]:
+        """Yield response chunks produced on the loop thread."""
+        chunks = self._client.stream(userquery)
+        try:
+            while (chunk := self._loop_thread.submit(_next_chunk(chunks))) is not None:
+                yield chunk
+        finally:
+            self._loop_thread.submit(chunks.aclose())
+
+    def close(self) -> None:
+        self._loop_thread.submit(self._client.close())
+
+def show_models() -> None:
+    """Print the configured model names."""
+    models = loader.get_all_models()
+    print("📋 Available Models:")
+    for model_type, info in models.items():
+        print(f"  {model_type}: {info['name']}")
+
+def show_default_models() -> None:
+    """Print the default model names."""
+    defaults = loader.get_default_models()
+    print("⚙️ Default Models:")
+    for key, value in defaults.items():
+        print(f"  {key}: {value}")
+
+def page_output(renderable, line_count: int) -> None:
+    """
+    Print renderable, through the user's $PAGER when it will not fit on screen.
+
+    Output that fits, or that is not going to a terminal, is printed directly.
+    """
+    console = get_console()
+    if console.is_terminal and line_count > console.height:
+        with console.pager(styles=True):
+            console.print(renderable)
+    else:
+        console.print(renderable)
+
+def show_memory() -> None:
+    """Show the memory contents, paged when they overflow the terminal."""
+    if not sys.stdout.isatty():
+        manager.view_memory()
+        return
+    from rich.text import Text
+
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        manager.view_memory()
+    text = buffer.getvalue().rstrip("\n")
+    page_output(Text(text), text.count("\n") + 1)
+
+def show_config() -> None:
+    """Print the full model configuration."""
+    print("📄 Full Model Configuration:", flush=True)
+    payload = json_compat.dumps(loader.config, indent=True)
+    if not sys.stdout.isatty():
+        sys.stdout.buffer.write(payload + b"\n")
+        sys.stdout.buffer.flush()
+        return
+    from rich.syntax import Syntax
+
+    page_output(Syntax(payload.decode("utf-8"), "json"), payload.count(b"\n") + 1)
+
+# Subcommand handlers, built once so dispatch is a single dict lookup
+SUBCOMMANDS = {
+    "memory": {
+        "clear": partial(manager.clear_memory, keep_system_prompt=True),
+        "clear-all": partial(manager.clear_memory, keep_system_prompt=False),
+        "view": show_memory,
+        "stats": manager.get_memory_stats,
+    },
+    "model": {
+        "summary": loader.print_summary,
+        "models": show_models,
+        "defaults": show_default_models,
+        "config": show_config,
+    },
+}
+_SUB_SETS = {main_cmd: frozenset(handlers) for main_cmd, handlers in SUBCOMMANDS.items()}
+_SUB_NAMES = {main_cmd: tuple(handlers) for main_cmd, handlers in SUBCOMMANDS.items()}
+_ALL_COMMANDS_LOWER = tuple(command.lower() for command in ALL_COMMANDS)
+
+try:
+    from rapidfuzz import fuzz as _fuzz, process as _fuzz_process
+except ImportError:
+    _fuzz_process = None
+
+@lru_cache(maxsize=128)
+def closest_command(word: str, candidates: tuple[str, ...]) -> str | None:
+    """
+    Return the candidate closest to word, or None if nothing is similar enough.
+
+    Uses rapidfuzz when installed and difflib otherwise; repeated typos are
+    answered from the cache.
+    """
+    word = word.lower()
+    if _fuzz_process is not None:
+        match = _fuzz_process.extractOne(word, candidates, scorer=_fuzz.ratio, score_cutoff=60)
+        return match[0] if match else None
+    matches = difflib.get_close_matches(word, candidates, n=1, cutoff=0.6)
+    return matches[0] if matches else None
+
 def handle_command(main_cmd: str, args: list[str]):
     """
     Unified handler for /memory and /model commands.
     main_cmd: "memory" or "model"
     args: list of subcommands (e.g. ["view"], ["summary"])
     """
-    subcommands = {
-        "memory": ["clear", "clear-all", "view", "stats"],
-        "model": ["summary", "models", "defaults", "config"],
-    }
+    names = _SUB_NAMES[main_cmd]
 
     if not args:
-        print(f"💡 Usage: /{main_cmd} <{'|'.join(subcommands[main_cmd])}>")
+        print(f"💡 Usage: /{main_cmd} <{'|'.join(names)}>")
         return
 
     raw_sub = args[0].lower()
 
-    # Fuzzy match subcommands
-    sub_cmd = difflib.get_close_matches(raw_sub, subcommands[main_cmd], n=1, cutoff=0.6)
-    if not sub_cmd:
-        print(f"❌ Unknown {main_cmd} command: {raw_sub}")
-        print(f"💡 Available: {', '.join(subcommands[main_cmd])}")
-        return
+    if raw_sub in _SUB_SETS[main_cmd]:
+        sub_cmd = raw_sub
+    else:
+        # Fuzzy match subcommands only when there is no exact hit
+        sub_cmd = closest_command(raw_sub, names)
+        if sub_cmd is None:
+            print(f"❌ Unknown {main_cmd} command: {raw_sub}")
+            print(f"💡 Available: {', '.join(names)}")
+            return
 
-    sub_cmd = sub_cmd[0]
-
-    if main_cmd == "memory":
-        if sub_cmd == "clear":
-            manager.clear_memory(keep_system_prompt=True)
-        elif sub_cmd == "clear-all":
-            manager.clear_memory(keep_system_prompt=False)
-        elif sub_cmd == "view":
-            manager.view_memory()
-        elif sub_cmd == "stats":
-            manager.get_memory_stats()
-
-    elif main_cmd == "model":
-        if sub_cmd == "summary":
-            loader.print_summary()
-        elif sub_cmd == "models":
-            models = loader.get_all_models()
-            print("📋 Available Models:")
-            for model_type, info in models.items():
-                print(f"  {model_type}: {info['name']}")
-        elif sub_cmd == "defaults":
-            defaults = loader.get_default_models()
-            print("⚙️ Default Models:")
-            for key, value in defaults.items():
-                print(f"  {key}: {value}")
-        elif sub_cmd == "config":
-            print("📄 Full Model Configuration:")
-            print(json.dumps(loader.config, indent=2))
-
-COMMANDS={
-    "memory": lambda args: handle_command("memory", args),
-    "model":  lambda args: handle_command("model", args),
+    SUBCOMMANDS[main_cmd][sub_cmd]()
+
+COMMANDS = {
+    "memory": partial(handle_command, "memory"),
+    "model": partial(handle_command, "model"),
 }
 
-def dispatch_command(query: str) -> bool:
+def run_batch(client: MCPClientWrapper, text: str) -> None:
+    """Run the ';;'-separated queries in text concurrently and print results in order."""
+    queries = [q.strip() for q in text.split(BATCH_SEPARATOR) if q.strip()]
+    if not queries:
+        print(f"💡 Usage: /batch <query> {BATCH_SEPARATOR} <query> ...")
+        return
+
+    print(f"Processing {len(queries)} queries concurrently...")
+    results = client.query_many(queries)
+    for i, (query, result) in enumerate(zip(queries, results), 1):
+        print(f"\n[{i}/{len(queries)}] {query}")
+        if isinstance(result, Exception):
+            print(f"❌ Error: {result}")
+        else:
+            print_result(result)
+
+def dispatch_command(query: str, client: MCPClientWrapper | None = None) -> bool:
     """
     Handle slash commands. Returns True if handled, False if not a command.
     """
@@ -215,16 +713,57 @@ def dispatch_command(query: str) -> bool:
         return True
 
     # Memory / Model
-    if command in COMMANDS:
-        COMMANDS[command](parts[1:])
+    handler = COMMANDS.get(command)
+    if handler is not None:
+        handler(parts[1:])
+        return True
+
+    # Concurrent batch of queries
+    if command == "batch":
+        if client is None:
+            print("❌ /batch is only available in interactive mode")
+        else:
+            run_batch(client, query[1:].split(None, 1)[1] if len(parts) > 1 else "")
         return True
 
     # Fuzzy match full command
-    suggestion = difflib.get_close_matches(query, ALL_COMMANDS, n=1, cutoff=0.6)
+    suggestion = closest_command(query, _ALL_COMMANDS_LOWER)
     print(f"❌ Unknown command: {query}")
-    print(f"💡 Did you mean: {suggestion[0] if suggestion else 'No similar command found'}")
+    print(f"💡 Did you mean: {suggestion or 'No similar command found'}")
     return True
 
+def parse_fast_path(argv: list[str]) -> argparse.Namespace | None:
+    """
+    Recognise the common invocations without building an ArgumentParser.
+
+    Handles `prog`, `prog "query"`, `prog -i`, `prog -q "query"`,
+    `prog --memory <cmd>` and `prog --model <cmd>`. Returns None for anything
+    else (help, --version, unknown flags, bad choices) so argparse can handle it.
+    """
+    args = argparse.Namespace(query=None, query_arg=None, interactive=False, memory=None, model=None)
+
+    if not argv:
+        return args
+    if len(argv) == 1:
+        if argv[0] in ('-i', '--interactive'):
+            args.interactive = True
+            return args
+        if not argv[0].startswith('-'):
+            args.query = argv[0]
+            return args
+    elif len(argv) == 2:
+        flag, value = argv
+        if flag in ('-q', '--query') and not value.startswith('-'):
+            args.query_arg = value
+            return args
+        if flag in ('-m', '--memory') and value in _SUB_SETS["memory"]:
+            args.memory = value
+            return args
+        if flag == '--model' and value in _SUB_SETS["model"]:
+            args.model = value
+            return args
+    return None
+
 def parse_arguments() -> argparse.Namespace:
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(
@@ -277,33 +816,54 @@ def parse_arguments() -> argparse.Namespace:
     
     return parser.parse_args()
 
-async def interactive_mode() -> None:
+def make_prompt():
+    """
+    Return a function reading one line of user input.
+
+    Uses prompt_toolkit with persistent history when it is installed and falls
+    back to the built-in input() otherwise.
+    """
+    try:
+        from prompt_toolkit import PromptSession
+        from prompt_toolkit.history import FileHistory
+    except ImportError:
+        return input
+    session = PromptSession(history=FileHistory(HISTORY_FILE))
+    return session.prompt
+
+def interactive_mode(client: MCPClientWrapper) -> None:
     """Run the agent in interactive mode."""
     print("Intelligent Agent CLI - Interactive Mode")
     print("Type '/bye', '/exit', '/quit' to exit")
     print("Type '/help' for usage information")
     print("Type '/memory <command>' for memory management")
     print("-" * 50)
-    
+
+    # Open the MCP session once and reuse it for every query
+    try:
+        client.connect()
+    except Exception as e:
+        print(f"Error connecting to MCP server: {e}")
+        return
+    # Tool discovery runs on the loop thread while the renderer warms up and the user types
+    client.start_warmup()
+    warm_up_renderer()
+    read_query = make_prompt()
+
     while True:
         try:
-            query = input("\nEnter your query: ").strip()
+            query = read_query("\nEnter your query: ").strip()
             
             if not query:
                 print("Please enter a query or type '/help'.")
                 continue
 
-            if dispatch_command(query):
+            if dispatch_command(query, client):
                 continue
 
             # Process regular queries through the intelligent agent
             print(f"Processing: {query}")
-            result = await run_intelligent_agent(query)
-            if result:
-                markdown = Markdown(result)
-                console.print(markdown)
-            else:
-                print("No response from agent.")
+            print_stream(client.stream(query))
                 
         except KeyboardInterrupt:
             print("\n\nInterrupted. Goodbye!")
@@ -315,9 +875,22 @@ async def interactive_mode() -> None:
             print(f"\nUnexpected error: {e}")
             print("Type '/bye' to exit or continue with another query.")
 
+def run_single_query(client: MCPClientWrapper, query: str) -> None:
+    """Run one query through the agent and render the result."""
+    print(f"Processing: {query}")
+    try:
+        client.connect()
+        print_stream(client.stream(query))
+    except Exception as e:
+        result = f"Error running intelligent agent: {e}"
+        debug_print(message=result)
+        import traceback
+        traceback.print_exc()
+        print_result(result)
+
 def main() -> None:
     """Main CLI entry point."""
-    args = parse_arguments()
+    args = parse_fast_path(sys.argv[1:]) or parse_arguments()
     
     if args.memory:
         handle_command("memory", [args.memory])
@@ -329,21 +902,21 @@ def main() -> None:
     # Determine the query to use
     query: str = args.query or args.query_arg
     
-    if args.interactive:
-        # Run in interactive mode
+    if args.interactive or query:
+        # One event loop thread hosts the MCP session for the whole run
+        loop_thread = AsyncLoopThread()
+        loop_thread.start()
+        client = MCPClientWrapper(loop_thread)
         try:
-            asyncio.run(interactive_mode())
+            if args.interactive:
+                interactive_mode(client)
+            else:
+                run_single_query(client, query)
         except KeyboardInterrupt:
             return
-    elif query:
-        # Run single query
-        print(f"Processing: {query}")
-        result = asyncio.run(run_intelligent_agent(query))
-        if result:
-            markdown = Markdown(result)
-            console.print(markdown)
-        else:
-            print("No response from agent.")
+        finally:
+            client.close()
+            loop_thread.stop()
 
     else:
         # No query provided, show help
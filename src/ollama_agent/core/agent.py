@@ -1,84 +1,68 @@
 from mcp import ClientSession
 from .ai_model_lib import AIModel
-import json
+from .model_loader import ModelConfigLoader
+from . import json_compat
+import asyncio
 import os
-import dotenv
+import re
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import AsyncIterator, Iterator
 from rich.console import Console
 from rich.markdown import Markdown
 
-dotenv.load_dotenv()
+# Try to load dotenv, but don't fail if it's not available
+try:
+    import dotenv
+except ImportError:
+    dotenv = None
 
-class IntelligentAgent:
-    printDebug:bool = os.getenv("DEBUG", "false").lower() == "true"  # Enable debug mode for detailed output
-    console = Console()
-    def __init__(self, Big_model=None, Small_model=None, config_path=None, avaliable_functions=[], list_of_tools=None) -> None:
-        # Load model configuration from JSON file
-        self.model_config = self._load_model_config(config_path)
-        
-        # Use provided models or fall back to config defaults
-        self.Big_model = Big_model or self.model_config['settings']['default_big_model']
-        self.Small_model = Small_model or self.model_config['settings']['default_small_model']
-        self.list_of_tools = list_of_tools  # This will be set later when tools are discovered
-        self.additional_parameter = None
-        
-        self.avaliable_functions = avaliable_functions
-        # Load model parameters from config
-        self.big_model_params = self.model_config['models']['big']['parameters']
-        self.small_model_params = self.model_config['models']['small']['parameters']
+# Patterns used to pull a tool call out of a model response
+_JSON_RE = re.compile(r'\{[^{}]*"tool_name"[^{}]*\}', re.DOTALL)
+_CODEBLOCK_RE = re.compile(r'```(?:json)?\s*\n?(.*?)\n?```', re.DOTALL)
+_FLEXIBLE_JSON_RE = re.compile(r'\{[^}]*"tool_name"[^}]*\}', re.DOTALL)
+_TRAILING_COMMA_OBJ = re.compile(r',\s*}')
+_TRAILING_COMMA_ARR = re.compile(r',\s*]')
+_TOOL_NAME_RE = re.compile(r'"tool_name"\s*:\s*"([^"]+)"')
+_QUERY_RE = re.compile(r'"query"\s*:\s*"([^"]+)"')
 
-    @staticmethod
-    def print_debug(isdebug: bool, message: str):
-        """
-        Print debug messages if debug mode is enabled.
-        
-        Args:
-            message: The message to print
-        """
-        if isdebug:
-            markdown = Markdown(f"**Debug:** {message}")
-            IntelligentAgent.console.print(markdown)
+def _find_tool_json(text: str) -> str | None:
+    """
+    Return the innermost {...} object around the first "tool_name" key, or None.
 
-    def _load_model_config(self, config_path=None) -> dict:
-        """Load model configuration from JSON file"""
-        if config_path is None:
-            # Default path relative to this file
-            config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'model.json')
-        
-        try:
-            with open(config_path, 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            # Fallback configuration if file doesn't exist
-            return {
-                'models': {
-                    'big': {'parameters': {'temperature': 0.1, 'max_tokens': 1000}},
-                    'small': {'parameters': {'temperature': 0.1, 'max_tokens': 500}}
-                },
-                'settings': {
-                    'default_big_model': 'gemma3:12b',
-                    'default_small_model': 'gemma3:1b'
-                }
-            }
-
-    async def handle_user_query(self, user_query: str, mcp_session: ClientSession) -> str:
-        """
-        Handle user query by deciding whether to search the web or answer directly.
-        
-        Args:
-            user_query: The query string from the user
-            mcp_session: The MCP client session to use for tool calls
-        
-        Returns:
-            The response string, either from tool call or direct answer
-        """
-        try:
-            if AIModel.function_call_avaliablity(self.Big_model):
-                # Use the AI model to process the query and decide on tool calls
-                aimodel = AIModel(
-                    model_name=self.Big_model, 
-                    temperature=self.big_model_params.get('temperature', 0.1),
-                    max_tokens=self.big_model_params.get('max_tokens', 1000),
-                    system_instruction=f"""
+    Gives the same result as _JSON_RE.search() but locates the braces with
+    str.find/rfind, which scan in C without backtracking; the regex is only
+    consulted when the first "tool_name" is not inside a flat object.
+    """
+    key = text.find('"tool_name"')
+    if key == -1:
+        return None
+    start = text.rfind('{', 0, key)
+    end = text.find('}', key)
+    if start != -1 and end != -1 and text.rfind('}', start, key) == -1 and text.find('{', key, end) == -1:
+        return text[start:end + 1].strip()
+    json_match = _JSON_RE.search(text)
+    return json_match.group(0).strip() if json_match else None
+
+# Text representation of each MCP content type returned by a tool call
+_CONTENT_HANDLERS = {
+    'text': lambda c: getattr(c, 'text', str(c)),
+    'image': lambda c: "[Image content]",
+    'audio': lambda c: "[Audio content]",
+    'resource': lambda c: f"[Resource: {getattr(c, 'uri', 'Unknown')}]",
+}
+_CONTENT_CLASS_HANDLERS = {
+    'TextContent': _CONTENT_HANDLERS['text'],
+    'ImageContent': _CONTENT_HANDLERS['image'],
+    'AudioContent': _CONTENT_HANDLERS['audio'],
+    'EmbeddedResource': _CONTENT_HANDLERS['resource'],
+    'ResourceLink': _CONTENT_HANDLERS['resource'],
+}
+
+# System prompts for the big model; the fallback one lists the tools inline
+_SYS_PROMPT_NATIVE = """
                     You are an AI assistant that can answer queries and call external tools when needed.  
 
                     ⚡ Behavior:
@@ -89,12 +73,12 @@ class IntelligentAgent:
                     ⚡ Tool Usage:
                     - When calling a tool, reply ONLY with valid JSON (no extra text).  
                     - JSON format (no trailing commas):  
-                    {{
+                    {
                     "tool_name": "<tool_name>",
-                    "args": {{
+                    "args": {
                         "<arg_name>": "<value>"
-                    }}
-                    }}
+                    }
+                    }
 
                     ⚡ Examples:
                     - "List files in current directory" → call `list_directory`  
@@ -102,63 +86,24 @@ class IntelligentAgent:
                     - "Check data folder" → call `list_directory` with path="data"  
 
                     IMPORTANT: Never mix natural language with JSON tool calls.
-                    """,
-                )
-                aimodel_response = aimodel.chat(user_query)
+                    """
+_SYS_PROMPT_SMALL_FORMATTER = """
+            You are a small AI assistant. Your job is to process the raw output returned by external tools and present it to the user in a clear, concise, and user-friendly way.
 
-                self.print_debug(self.printDebug, f"**AI Model Response:**\n\n{aimodel_response}")
-                
-                # The response from chat() is already a parsed dictionary, not a JSON string
-                if isinstance(aimodel_response, dict):
-                    # Extract the actual content from the response
-                    actual_content = aimodel_response.get('message', {}).get('content', '')
-                    self.print_debug(self.printDebug, f"**Debug - Extracted Content:** {actual_content}")
-                    
-                    # Check for native function calls first
-                    calltools = aimodel_response.get('message', {}).get('tool_calls', [])
-                    
-                    if calltools:
-                        for tool in calltools:
-                            self.print_debug(self.printDebug, f"**Available Tool:** {tool}")
-                            tools_result = await self.handle_tool_call(tool['function']['name'], tool['function']['arguments'], mcp_session)
-                        
-                        self.print_debug(self.printDebug, f"**Tool Call Result:** {tools_result}")
-                        return f"**Tool Call Result:**\n\n{tools_result}"
-                else:
-                    # If it's a string, try to parse it
-                    try:
-                        response_data = json.loads(aimodel_response)
-                        actual_content = response_data.get('message', {}).get('content', aimodel_response)
-                        self.print_debug(self.printDebug, f"**Debug - Extracted Content:** {actual_content}")
-                    except json.JSONDecodeError:
-                        actual_content = aimodel_response
-                
-                # Try to extract tool call from the content using JSON parsing
-                extracted_json = self.handle_json_fields(actual_content)
-                
-                if extracted_json[0] is not None:  # Check if tool_name is not None
-                    tool_name, args = extracted_json
-                    self.print_debug(self.printDebug, f"Executing Tool: {tool_name} with args: {args}")
-                    tool_result = await self.handle_tool_call(tool_name, args, mcp_session)
-
-                    # Process the tool result with the small model for better formatting
-                    tool_result = aimodel.chat(tool_result, isCallTool=True)
-                    self.print_debug(self.printDebug, f"**Tool Call Result before processed:**\n\n{tool_result}")
-                    return f"**Tool Call Result:**\n\n{tool_result}"
-                else:
-                    # Return the direct AI response if no tool call is needed
-                    return f"**Direct Response:**\n\n{actual_content}"
-            else:
-                # ...existing code for fallback path...
-                aimodel = AIModel(
-                    model_name=self.Big_model, 
-                    temperature=self.big_model_params.get('temperature', 0.1),
-                    max_tokens=self.big_model_params.get('max_tokens', 1000),
-                    system_instruction=f"""
+            Rules:
+            - Always focus on answering the user’s original query directly and clearly.
+            - Summarize or reformat the tool output so it is easy to understand.
+            - Keep the answer concise and remove irrelevant or redundant details.
+            - If the tool output contains unrelated information, ignore it unless it directly helps answer the query.
+            - Use plain text, bullet points, or JSON if structured output is requested.
+            - Never invent new information; stick strictly to the tool output.
+            - Ensure tone is factual, neutral, and helpful.
+            """
+_SYS_PROMPT_FALLBACK_TMPL = """
                     You are an AI assistant that can call external tools to answer queries. 
                     You CANNOT answer questions about current events or today's news using your own knowledge. 
                     Available tools: 
-                    {self.list_of_tools} 
+                    {tools} 
 
                     Rules: 
                     - If the user asks for recent info, trends, news, or data not in your knowledge, use google_search 
@@ -180,44 +125,315 @@ class IntelligentAgent:
                     - "Check what's in the data folder" → use list_directory with path="data" 
                     
                     IMPORTANT: Ensure valid JSON syntax - no trailing commas after the last property!
-                    """,
-                )
-                aimodel_response = aimodel.chat(user_query)
+                    """
 
-                self.print_debug(self.printDebug, f"💬 **AI Model Response:**\n\n{aimodel_response}")
-                
-                # Handle the response based on its type
-                if isinstance(aimodel_response, dict):
-                    actual_content = aimodel_response.get('message', {}).get('content', '')
-                    self.print_debug(self.printDebug, f"**Debug - Extracted Content:** {actual_content}")
-                else:
-                    try:
-                        response_data = json.loads(aimodel_response)
-                        actual_content = response_data.get('message', {}).get('content', aimodel_response)
-                        self.print_debug(self.printDebug, f"**Debug - Extracted Content:** {actual_content}")
-                    except json.JSONDecodeError:
-                        actual_content = aimodel_response
-                
-                extracted_json = self.handle_json_fields(actual_content)
-                
-                if extracted_json[0] is not None:  # Check if tool_name is not None
-                    tool_name, args = extracted_json
-                    print(f"**Executing Tool:** {tool_name} with args: {args}")
-                    tool_result = await self.handle_tool_call(tool_name, args, mcp_session)
-
-                    self.print_debug(self.printDebug, f"**Tool Call Result before processed:**\n\n{tool_result}")
-                    # Process the tool result with the small model for better formatting
-                    tool_result = aimodel.chat(tool_result, isCallTool=True)
-                    self.print_debug(self.printDebug, f"**Tool Call Result before processed:**\n\n{tool_result}")
-                    return f"**Tool Call Result:**\n\n{tool_result}"
-                else:
-                    # Return the direct AI response if no tool call is needed
-                    return f"**Direct Response:**\n\n{actual_content}"
+# Concurrent small-model formatting requests are grouped into one generate call
+_FORMAT_BATCH_SIZE = 8
+_FORMAT_BATCH_TIMEOUT = 0.02  # seconds to wait for more requests before flushing
+_FORMAT_BATCH_HEADER_RE = re.compile(r'^#{1,6}\s*RESULT\s+(\d+)\s*$', re.MULTILINE)
+
+# Tool results at most this long are shown as-is instead of being reformatted by a model
+_REFORMAT_MIN_CHARS = 300
+_REFORMAT_MIN_LINES = 10
+
+# Tools whose results depend on or change external state are never served from cache;
+# running one also drops every cached result
+_NON_CACHEABLE_TOOLS = frozenset({'execute_cli_command', 'get_memory'})
+
+
+class _ToolResultCache:
+    """Small LRU cache whose entries expire after a fixed time-to-live."""
+
+    __slots__ = ('maxsize', 'ttl', '_entries')
+
+    def __init__(self, maxsize: int = 128, ttl: float = 60.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
+
+    def get(self, key: tuple) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: tuple, value: str) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+class IntelligentAgent:
+    printDebug:bool = False  # Enable debug mode for detailed output, read from DEBUG on first construction
+    console = Console()
+    _env_loaded: bool = False  # .env is loaded once, when the first agent is created
+    # printDebug, console and _env_loaded stay class attributes shared by all agents
+    __slots__ = (
+        'model_config', 'Big_model', 'Small_model', 'list_of_tools', 'additional_parameter',
+        'avaliable_functions', 'big_model_params', 'small_model_params',
+        '_big_temp', '_big_maxtok', '_small_temp', '_small_maxtok',
+        'bypass_reformat_tools', '_fallback_prompt', '_tool_cache', '_model_cache', '_native_tools',
+        '_format_batch', '_format_flush', '_format_tasks',
+    )
+    def __init__(self, Big_model=None, Small_model=None, config_path=None, avaliable_functions=None, list_of_tools=None) -> None:
+        if not IntelligentAgent._env_loaded:
+            if dotenv is not None:
+                dotenv.load_dotenv()
+            IntelligentAgent.printDebug = os.getenv("DEBUG", "false").lower() == "true"
+            IntelligentAgent._env_loaded = True
+
+        # Load model configuration from JSON file
+        self.model_config = self._load_model_config(config_path)
+        
+        # Use provided models or fall back to config defaults
+        self.Big_model = Big_model or self.model_config['settings']['default_big_model']
+        self.Small_model = Small_model or self.model_config['settings']['default_small_model']
+        self.list_of_tools = list_of_tools  # This will be set later when tools are discovered
+        self._fallback_prompt: tuple | None = None  # (list_of_tools, formatted prompt)
+        self._tool_cache = _ToolResultCache()  # Extracted results of recent idempotent tool calls
+        self._native_tools: bool | None = None  # Whether Big_model supports function calling, probed on first use
+        # Tools whose output is already readable and skips the reformatting pass
+        self.bypass_reformat_tools = frozenset(self.model_config['settings'].get('bypass_smallmodel_reformat', ()))
+        self._model_cache: dict[tuple, list[AIModel]] = {}  # Idle AIModels per (role, model name, system prompt, has tools)
+        self._format_batch: list[tuple[str, str, asyncio.Future]] = []  # Pending small-model formatting requests
+        self._format_flush: asyncio.TimerHandle | None = None
+        self._format_tasks: set[asyncio.Task] = set()
+        self.additional_parameter = None
+        
+        self.avaliable_functions = avaliable_functions if avaliable_functions is not None else []
+        # Load model parameters from config; read-only views since the config is shared between agents
+        self.big_model_params = MappingProxyType(self.model_config['models']['big']['parameters'])
+        self.small_model_params = MappingProxyType(self.model_config['models']['small']['parameters'])
+        self._big_temp = self.big_model_params.get('temperature', 0.1)
+        self._big_maxtok = self.big_model_params.get('max_tokens', 1000)
+        self._small_temp = self.small_model_params.get('temperature', 0.1)
+        self._small_maxtok = self.small_model_params.get('max_tokens', 500)
+
+    @staticmethod
+    def print_debug(isdebug: bool, message: str):
+        """
+        Print debug messages if debug mode is enabled.
+        
+        Args:
+            message: The message to print
+        """
+        if isdebug:
+            markdown = Markdown(f"**Debug:** {message}")
+            IntelligentAgent.console.print(markdown)
+
+    @staticmethod
+    def _load_model_config(config_path=None) -> dict:
+        """Load model configuration through ModelConfigLoader, which parses each file once per process"""
+        return ModelConfigLoader(config_path).config
+
+    async def handle_user_query(self, user_query: str, mcp_session: ClientSession, batch_format: bool = False) -> str:
+        """
+        Handle user query by deciding whether to search the web or answer directly.
+        
+        Args:
+            user_query: The query string from the user
+            mcp_session: The MCP client session to use for tool calls
+            batch_format: Reformat tool output with the small model through
+                format_tool_response(), so concurrent queries share model calls
+        
+        Returns:
+            The response string, either from tool call or direct answer
+        """
+        return "".join([chunk async for chunk in self.stream_user_query(user_query, mcp_session, batch_format)])
+
+    async def stream_user_query(self, user_query: str, mcp_session: ClientSession, batch_format: bool = False) -> AsyncIterator[str]:
+        """
+        Same as handle_user_query, but yields the response in chunks as soon as
+        they are available, e.g. the result header before a slow tool call.
+        
+        Args:
+            user_query: The query string from the user
+            mcp_session: The MCP client session to use for tool calls
+            batch_format: See handle_user_query
+        
+        Yields:
+            Consecutive pieces of the response string
+        """
+        try:
+            native_tools = self._native_tools
+            if native_tools is None:
+                native_tools = await self._probe_native_tools()
+            # Use the AI model to process the query and decide on tool calls
+            # Native tool calling needs the tool schemas in the request; without it the
+            # model names the tool in JSON text, which _finalize() parses
+            tools = self.avaliable_functions if native_tools else None
+            with self._get_model("big", self._system_instruction(native_tools), tools=tools) as aimodel:
+                aimodel_response = await aimodel.chat(user_query)
+
+                if self.printDebug:
+                    self.print_debug(True, f"**AI Model Response:**\n\n{aimodel_response}")
+
+                actual_content, calltools = self._extract_content(aimodel_response)
+
+                # Check for native function calls first
+                if native_tools and calltools:
+                    for tool in calltools:
+                        if self.printDebug:
+                            self.print_debug(True, f"**Available Tool:** {tool}")
+                    # Independent calls run concurrently and every result is kept
+                    results = await asyncio.gather(*(
+                        self.handle_tool_call(tool['function']['name'], tool['function']['arguments'], mcp_session)
+                        for tool in calltools
+                    ))
+                    tools_result = "\n\n".join(results)
+
+                    if self.printDebug:
+                        self.print_debug(True, f"**Tool Call Result:** {tools_result}")
+                    yield f"**Tool Call Result:**\n\n{tools_result}"
+                    return
+
+                async for chunk in self._finalize(aimodel, actual_content, mcp_session, user_query if batch_format else None):
+                    yield chunk
             
         except Exception as e:
-            return f"**Error processing query:** {str(e)}"
+            yield f"**Error processing query:** {str(e)}"
     
-    def small_model_handle_tool_response(self, tool_response: str, model: str = "", userprompt: str = "") -> str:
+    async def _probe_native_tools(self) -> bool:
+        """
+        Find out once whether Big_model supports function calling. A failed probe
+        is not remembered: this query uses the JSON prompt and the next one retries.
+        """
+        try:
+            # The probe is a blocking chat round-trip, so keep it off the event loop
+            self._native_tools = await asyncio.to_thread(AIModel.function_call_avaliablity, self.Big_model)
+        except Exception as e:
+            if self.printDebug:
+                self.print_debug(True, f"**Function calling probe failed, retrying next query:** {e}")
+            return False
+        return self._native_tools
+
+    def _system_instruction(self, native_tools: bool) -> str:
+        """
+        Return the big model's system prompt.
+        
+        Args:
+            native_tools: Whether the model supports native function calling; the
+                fallback prompt lists the available tools inline instead
+        """
+        if native_tools:
+            return _SYS_PROMPT_NATIVE
+        # Only the tool list varies, so reuse the formatted prompt until it changes
+        if self._fallback_prompt is None or self._fallback_prompt[0] is not self.list_of_tools:
+            self._fallback_prompt = (self.list_of_tools, _SYS_PROMPT_FALLBACK_TMPL.format(tools=self.list_of_tools))
+        return self._fallback_prompt[1]
+
+    @contextmanager
+    def _get_model(self, role: str, system_instruction: str, model_name: str | None = None, tools: list | None = None) -> Iterator[AIModel]:
+        """
+        Lend an AIModel for a role ("big" or "small"), reusing idle instances.
+        
+        An instance keeps its in-memory history and token statistics between
+        chats, so each concurrent query gets its own; it goes back to the idle
+        pool when the with-block ends. All instances still share the memory
+        file, so a query sees the turns that other queries have finished.
+        
+        Args:
+            role: Which configured model to use
+            system_instruction: The system prompt for the model
+            model_name: Overrides the configured model name for the role
+            tools: Tool schemas sent with every chat request, for native tool calls
+        """
+        model_name = model_name or (self.Big_model if role == "big" else self.Small_model)
+        idle = self._model_cache.setdefault((role, model_name, system_instruction, tools is not None), [])
+        if idle:
+            aimodel = idle.pop()
+        else:
+            big = role == "big"
+            aimodel = AIModel(
+                model_name=model_name, 
+                temperature=self._big_temp if big else self._small_temp,
+                max_tokens=self._big_maxtok if big else self._small_maxtok,
+                system_instruction=system_instruction,
+                available_functions=tools,
+            )
+        try:
+            yield aimodel
+        finally:
+            idle.append(aimodel)
+
+    def _extract_content(self, aimodel_response) -> tuple[str, list]:
+        """
+        Pull the text content and any native tool calls out of a model response.
+        
+        Returns:
+            A tuple of the response content and the list of native tool calls
+        """
+        if isinstance(aimodel_response, dict):
+            # Extract the actual content from the response
+            message = aimodel_response.get('message', {})
+            actual_content = message.get('content', '')
+            if self.printDebug:
+                self.print_debug(True, f"**Debug - Extracted Content:** {actual_content}")
+            return actual_content, message.get('tool_calls', [])
+
+        # If it's a string that looks like a JSON object, try to parse it
+        actual_content = aimodel_response
+        if aimodel_response and aimodel_response.lstrip().startswith('{'):
+            try:
+                response_data = json_compat.loads(aimodel_response)
+                actual_content = response_data.get('message', {}).get('content', aimodel_response)
+                if self.printDebug:
+                    self.print_debug(True, f"**Debug - Extracted Content:** {actual_content}")
+            except json_compat.JSONDecodeError:
+                pass
+        return actual_content, []
+
+    async def _finalize(self, aimodel: AIModel, actual_content: str, mcp_session: ClientSession, batch_prompt: str | None = None) -> AsyncIterator[str]:
+        """
+        Run the tool call embedded in the response text, or yield the text as the answer.
+        
+        Args:
+            aimodel: The model that produced the response, used to format tool output
+            actual_content: The response text
+            mcp_session: The MCP client session to use for tool calls
+            batch_prompt: The user query, when tool output should go through the
+                batched small-model formatter instead of being streamed by aimodel
+        """
+        # Try to extract tool call from the content using JSON parsing
+        tool_name, args = self.handle_json_fields(actual_content)
+
+        if tool_name is None:
+            # Return the direct AI response if no tool call is needed
+            yield f"**Direct Response:**\n\n{actual_content}"
+            return
+
+        if self.printDebug:
+            self.print_debug(True, f"Executing Tool: {tool_name} with args: {args}")
+        yield "**Tool Call Result:**\n\n"
+        tool_result = await self.handle_tool_call(tool_name, args, mcp_session)
+        if self.printDebug:
+            self.print_debug(True, f"**Tool Call Result before processed:**\n\n{tool_result}")
+
+        # Process the tool result with the model for better formatting, unless it is already short
+        if self._needs_reformat(tool_name, tool_result):
+            if batch_prompt is not None:
+                yield await self.format_tool_response(tool_result, userprompt=batch_prompt)
+                return
+            async for chunk in aimodel.chat_stream(tool_result, isCallTool=True):
+                yield chunk
+            return
+        yield tool_result
+
+    def _needs_reformat(self, tool_name: str, tool_result: str) -> bool:
+        """Whether a tool result is worth another model call to reformat"""
+        if tool_name in self.bypass_reformat_tools:
+            return False
+        return len(tool_result) >= _REFORMAT_MIN_CHARS or tool_result.count('\n') >= _REFORMAT_MIN_LINES
+    
+    async def small_model_handle_tool_response(self, tool_response: str, model: str = "", userprompt: str = "") -> str:
         """
         Handle user query using a smaller model for faster responses.
         
@@ -233,27 +449,93 @@ class IntelligentAgent:
             return "No model specified for processing tool response."
 
         processed_prompt = tool_response + f"\n\n User Prompt: {userprompt}"
-        self.print_debug(isdebug=self.printDebug, message=f"**Debug - Processed Prompt for Small Model:** {processed_prompt}")
-        aimodel = AIModel(
-            model_name=model,
-            temperature=self.small_model_params.get('temperature', 0.1),
-            max_tokens=self.small_model_params.get('max_tokens', 500),
-            system_instruction=f"""
-            You are a small AI assistant. Your job is to process the raw output returned by external tools and present it to the user in a clear, concise, and user-friendly way.
+        if self.printDebug:
+            self.print_debug(isdebug=True, message=f"**Debug - Processed Prompt for Small Model:** {processed_prompt}")
+        with self._get_model("small", _SYS_PROMPT_SMALL_FORMATTER, model) as aimodel:
+            return await aimodel.generate_response(tool_response)
 
-            Rules:
-            - Always focus on answering the user’s original query directly and clearly.
-            - Summarize or reformat the tool output so it is easy to understand.
-            - Keep the answer concise and remove irrelevant or redundant details.
-            - If the tool output contains unrelated information, ignore it unless it directly helps answer the query.
-            - Use plain text, bullet points, or JSON if structured output is requested.
-            - Never invent new information; stick strictly to the tool output.
-            - Ensure tone is factual, neutral, and helpful.
-            """
+    async def format_tool_response(self, tool_response: str, userprompt: str = "") -> str:
+        """
+        Format a tool response with the small model, batching concurrent requests.
+        
+        Requests arriving within a short window (or until the batch is full) are
+        sent to the small model as a single prompt, so many concurrent queries
+        pay the fixed per-call cost once.
+        
+        Args:
+            tool_response: The response string from the tool
+            userprompt: The user query the tool was called for
+        
+        Returns:
+            The formatted response string
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._format_batch.append((tool_response, userprompt, future))
+        if len(self._format_batch) >= _FORMAT_BATCH_SIZE:
+            self._flush_format_batch()
+        elif self._format_flush is None:
+            self._format_flush = loop.call_later(_FORMAT_BATCH_TIMEOUT, self._flush_format_batch)
+        return await future
+
+    def _flush_format_batch(self) -> None:
+        """Send the pending formatting requests to the small model"""
+        if self._format_flush is not None:
+            self._format_flush.cancel()
+            self._format_flush = None
+        batch, self._format_batch = self._format_batch, []
+        if batch:
+            task = asyncio.create_task(self._run_format_batch(batch))
+            self._format_tasks.add(task)
+            task.add_done_callback(self._format_tasks.discard)
+
+    async def _run_format_batch(self, batch: list[tuple[str, str, asyncio.Future]]) -> None:
+        """Format a batch of tool responses and resolve each request's future"""
+        try:
+            if len(batch) == 1:
+                tool_response, userprompt, _ = batch[0]
+                results = [await self.small_model_handle_tool_response(tool_response, userprompt=userprompt)]
+            else:
+                results = await self._format_many([(response, prompt) for response, prompt, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _format_many(self, items: list[tuple[str, str]]) -> list[str]:
+        """
+        Format several tool responses with one small-model call.
+        
+        Falls back to one call per item when the model does not answer with
+        exactly one section per input.
+        """
+        sections = [
+            f"### INPUT {i}\nUser Prompt: {userprompt}\nTool Output:\n{tool_response}"
+            for i, (tool_response, userprompt) in enumerate(items, 1)
+        ]
+        prompt = (
+            f"Process each of the following {len(items)} tool outputs independently. "
+            f"Answer with exactly {len(items)} sections, in order, each starting with "
+            f"a line '### RESULT <number>' and containing only the formatted output.\n\n"
+            + "\n\n".join(sections)
         )
+        with self._get_model("small", _SYS_PROMPT_SMALL_FORMATTER) as aimodel:
+            response = await aimodel.generate_response(prompt)
 
-        processed_response = aimodel.generate_response(tool_response)
-        return processed_response
+        parts = _FORMAT_BATCH_HEADER_RE.split(response)
+        # split() yields [preamble, number, body, number, body, ...]
+        numbers, bodies = parts[1::2], parts[2::2]
+        if numbers != [str(i) for i in range(1, len(items) + 1)]:
+            if self.printDebug:
+                self.print_debug(True, "**Debug - Batched formatting output malformed, formatting items one by one**")
+            return list(await asyncio.gather(*(
+                self.small_model_handle_tool_response(tool_response, userprompt=userprompt) for tool_response, userprompt in items
+            )))
+        return [body.strip() for body in bodies]
 
     def handle_json_fields(self, text: str) -> tuple:
         """
@@ -265,78 +547,76 @@ class IntelligentAgent:
         Returns:
             A tuple containing the tool name and arguments
         """
-        import re
+        if self.printDebug:
+            self.print_debug(isdebug=True, message=f"**Debug - Input text:** {text}")
         
-        self.print_debug(isdebug=self.printDebug, message=f"**Debug - Input text:** {text}")
+        # Plain prose never names a tool, so skip the regex scans entirely
+        if '"tool_name"' not in text:
+            if self.printDebug:
+                self.print_debug(isdebug=True, message="**Debug - No tool_name found, treating as plain text**")
+            return None, {}
         
         # First, try to find JSON directly in the text (without code blocks)
         # Look for JSON-like structure starting with { and ending with }
-        json_pattern = r'\{[^{}]*"tool_name"[^{}]*\}'
-        json_match = re.search(json_pattern, text, re.DOTALL)
+        json_text = _find_tool_json(text)
         
-        if json_match:
-            json_text = json_match.group(0).strip()
-            self.print_debug(isdebug=self.printDebug, message=f"**Debug - Found JSON with regex:** {json_text}")
+        if json_text is not None:
+            if self.printDebug:
+                self.print_debug(isdebug=True, message=f"**Debug - Found JSON with regex:** {json_text}")
         else:
             # Try to extract JSON from markdown code blocks
-            json_match = re.search(r'```(?:json)?\s*\n?(.*?)\n?```', text, re.DOTALL)
-            if (json_match):
+            json_match = _CODEBLOCK_RE.search(text) if '```' in text else None
+            if json_match:
                 json_text = json_match.group(1).strip()
-                self.print_debug(isdebug=self.printDebug, message=f"**Debug - Found JSON in code block:** {json_text}")
+                if self.printDebug:
+                    self.print_debug(isdebug=True, message=f"**Debug - Found JSON in code block:** {json_text}")
             else:
                 # Try a more flexible approach - look for any content that starts with { and contains tool_name
-                flexible_pattern = r'\{[^}]*"tool_name"[^}]*\}'
-                flexible_match = re.search(flexible_pattern, text, re.DOTALL)
+                flexible_match = _FLEXIBLE_JSON_RE.search(text)
                 
                 if flexible_match:
                     json_text = flexible_match.group(0).strip()
-                    self.print_debug(isdebug=self.printDebug, message=f"**Debug - Found JSON with flexible pattern:** {json_text}")
+                    if self.printDebug:
+                        self.print_debug(isdebug=True, message=f"**Debug - Found JSON with flexible pattern:** {json_text}")
                 else:
-                    # Check if this looks like it's intended to contain JSON
-                    has_json_markers = (
-                        '```json' in text.lower() or 
-                        '```' in text or
-                        ('{' in text and '"tool_name"' in text)
-                    )
-                    
-                    self.print_debug(isdebug=self.printDebug, message=f"**Debug - Has JSON markers:** {has_json_markers}")
-                    
-                    if not has_json_markers:
-                        # This is likely a plain text response, not intended as JSON
-                        self.print_debug(isdebug=self.printDebug, message="**Debug - No JSON markers found, treating as plain text**")
-                        return None, {}
-                    else:
-                        # No JSON structure found despite markers
-                        self.print_debug(isdebug=self.printDebug, message="**Debug - JSON markers found but no valid JSON structure**")
-                        return None, {}
-        
-        # Clean up common JSON formatting issues
-        json_text = re.sub(r',\s*}', '}', json_text)  # Remove trailing commas before closing braces
-        json_text = re.sub(r',\s*]', ']', json_text)  # Remove trailing commas before closing brackets
-        
-        self.print_debug(isdebug=self.printDebug, message=f"**Debug - Cleaned JSON text:** {json_text}")
+                    # No JSON structure found despite the tool_name marker
+                    if self.printDebug:
+                        self.print_debug(isdebug=True, message="**Debug - JSON markers found but no valid JSON structure**")
+                    return None, {}
         
         try:
-            # Parse the JSON string
-            extracted_json: dict = json.loads(json_text)
+            # Parse the JSON string; well-formed output needs no cleanup
+            try:
+                extracted_json: dict = json_compat.loads(json_text)
+            except json_compat.JSONDecodeError:
+                # Clean up common JSON formatting issues and retry
+                json_text = _TRAILING_COMMA_OBJ.sub('}', json_text)  # Remove trailing commas before closing braces
+                json_text = _TRAILING_COMMA_ARR.sub(']', json_text)  # Remove trailing commas before closing brackets
+                
+                if self.printDebug:
+                    self.print_debug(isdebug=True, message=f"**Debug - Cleaned JSON text:** {json_text}")
+                
+                extracted_json = json_compat.loads(json_text)
             
             # Extract fields
             tool_name = extracted_json.get("tool_name")
             args = extracted_json.get("args", {})
             
-            self.print_debug(isdebug=self.printDebug, message=f"**Debug - Extracted tool_name:** {tool_name}")
-            self.print_debug(isdebug=self.printDebug, message=f"**Debug - Extracted args:** {args}")
+            if self.printDebug:
+                self.print_debug(isdebug=True, message=f"**Debug - Extracted tool_name:** {tool_name}")
+                self.print_debug(isdebug=True, message=f"**Debug - Extracted args:** {args}")
             
             return tool_name, args
-        except json.JSONDecodeError as e:
+        except json_compat.JSONDecodeError as e:
             # Handle invalid JSON - try to be more forgiving
-            self.print_debug(isdebug=self.printDebug, message=f"Error decoding JSON: {e}")
-            self.print_debug(isdebug=self.printDebug, message=f"Attempted to parse: {json_text[:100]}...")
+            if self.printDebug:
+                self.print_debug(isdebug=True, message=f"Error decoding JSON: {e}")
+                self.print_debug(isdebug=True, message=f"Attempted to parse: {json_text[:100]}...")
             
             # Try to extract tool_name and args with regex as fallback
             try:
-                tool_match = re.search(r'"tool_name"\s*:\s*"([^"]+)"', text)
-                query_match = re.search(r'"query"\s*:\s*"([^"]+)"', text)
+                tool_match = _TOOL_NAME_RE.search(text)
+                query_match = _QUERY_RE.search(text)
                 
                 if tool_match:
                     tool_name = tool_match.group(1)
@@ -344,12 +624,14 @@ class IntelligentAgent:
                     if query_match:
                         args["query"] = query_match.group(1)
                     
-                    self.print_debug(isdebug=self.printDebug, message=f"**Debug - Fallback extraction - tool_name:** {tool_name}")
-                    self.print_debug(isdebug=self.printDebug, message=f"**Debug - Fallback extraction - args:** {args}")
+                    if self.printDebug:
+                        self.print_debug(isdebug=True, message=f"**Debug - Fallback extraction - tool_name:** {tool_name}")
+                        self.print_debug(isdebug=True, message=f"**Debug - Fallback extraction - args:** {args}")
                     
                     return tool_name, args
             except Exception as fallback_error:
-                self.print_debug(isdebug=self.printDebug, message=f"Fallback parsing also failed: {fallback_error}")
+                if self.printDebug:
+                    self.print_debug(isdebug=True, message=f"Fallback parsing also failed: {fallback_error}")
             
             return None, {}
 
@@ -368,6 +650,26 @@ class IntelligentAgent:
         if not tool_name or not isinstance(args, dict):
             return "Invalid tool name or arguments."
 
+        cache_key = None
+        if tool_name not in _NON_CACHEABLE_TOOLS:
+            cache_key = (tool_name, json_compat.dumps(args, sort_keys=True))
+            cached = self._tool_cache.get(cache_key)
+            if cached is not None:
+                if self.printDebug:
+                    self.print_debug(True, f"**Tool result served from cache:** {tool_name}")
+                return cached
+
+        result_text = await self._call_tool(tool_name, args, mcp_session)
+        if cache_key is not None:
+            self._tool_cache.set(cache_key, result_text)
+        else:
+            # A non-cacheable tool may have changed what the cached results describe
+            # (e.g. a CLI command writing to a listed directory)
+            self._tool_cache.clear()
+        return result_text
+
+    async def _call_tool(self, tool_name: str, args: dict, mcp_session: ClientSession) -> str:
+        """Call the tool over MCP and extract its result as text"""
         result = await mcp_session.call_tool(tool_name, args)
 
         if result is not None:
@@ -375,42 +677,17 @@ class IntelligentAgent:
             if hasattr(result, 'content') and result.content:
                 # Extract text from content list
                 text_parts = []
+                append = text_parts.append
                 for content_item in result.content:
-                    # Check the type of content and handle accordingly
-                    if hasattr(content_item, 'type'):
-                        if content_item.type == 'text':
-                            # Safely get text attribute only for text content
-                            text_content = getattr(content_item, 'text', str(content_item))
-                            text_parts.append(text_content)
-                        elif content_item.type == 'image':
-                            text_parts.append("[Image content]")
-                        elif content_item.type == 'audio':
-                            text_parts.append("[Audio content]")
-                        elif content_item.type == 'resource':
-                            text_parts.append(f"[Resource: {getattr(content_item, 'uri', 'Unknown')}]")
-                        else:
-                            # For any other content type, try to convert to string
-                            text_parts.append(str(content_item))
+                    # Dispatch on the MCP content type, or on the class name for untyped items
+                    content_type = getattr(content_item, 'type', None)
+                    if content_type is not None:
+                        handler = _CONTENT_HANDLERS.get(content_type)
                     else:
-                        # Check if it's a text content type by checking the class name
-                        content_type_name = type(content_item).__name__
-                        if content_type_name == 'TextContent':
-                            # Safely get text attribute only for TextContent objects
-                            text_content = getattr(content_item, 'text', str(content_item))
-                            text_parts.append(text_content)
-                        else:
-                            # For non-text content types, provide appropriate representation
-                            if 'Image' in content_type_name:
-                                text_parts.append("[Image content]")
-                            elif 'Audio' in content_type_name:
-                                text_parts.append("[Audio content]")
-                            elif 'Resource' in content_type_name:
-                                text_parts.append(f"[Resource: {getattr(content_item, 'uri', 'Unknown')}]")
-                            else:
-                                # Last resort: convert to string
-                                text_parts.append(str(content_item))
+                        handler = _CONTENT_CLASS_HANDLERS.get(type(content_item).__name__)
+                    append(handler(content_item) if handler else str(content_item))
                 
-                extracted_text = '\n'.join(text_parts) if text_parts else "No text content found"
+                extracted_text = '\n'.join(text_parts)
                 
                 if extracted_text and extracted_text not in ["[]", "No results", ""]:
                     return extracted_text
@@ -1,10 +1,78 @@
+import asyncio
 import os
+import threading
+import weakref
+from collections import deque
+from functools import partial
 from pathlib import Path
-from ollama import Client
+from typing import AsyncIterator, Callable
+import httpx
+from ollama import AsyncClient, Client
 from ollama._types import ResponseError  # Import the error type
 import subprocess
-import psutil
-import json
+from .memory_manager import (
+    append_history, compact_history, keep_system_messages, load_history, memory_lock, memory_log_path, save_history,
+)
+
+OLLAMA_HOST = "http://localhost:11434"
+
+# Connections to Ollama are pooled and kept alive between requests. The server
+# speaks HTTP/1.1 only, so HTTP/2 would not help; a warm keep-alive pool
+# avoids a new TCP connection per request.
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=40, max_connections=100, keepalive_expiry=30.0)
+_HTTP_TIMEOUT = httpx.Timeout(None, connect=10.0)  # Generations may run long; only connecting is bounded
+
+_sync_client: Client | None = None
+# httpx.AsyncClient connections belong to the event loop that opened them
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncClient]" = weakref.WeakKeyDictionary()
+_request_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def shared_client() -> Client:
+    """Return the process-wide synchronous Ollama client"""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = Client(OLLAMA_HOST, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+    return _sync_client
+
+def shared_async_client() -> AsyncClient:
+    """Return the asynchronous Ollama client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncClient(OLLAMA_HOST, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+    return client
+
+def request_slots() -> asyncio.Semaphore:
+    """
+    Return the semaphore capping in-flight Ollama requests on the running event loop.
+
+    Shared by every AIModel, so the cap holds for the whole process rather than
+    per model instance.
+    """
+    loop = asyncio.get_running_loop()
+    slots = _request_slots.get(loop)
+    if slots is None:
+        # Cap in-flight requests at the number of requests the Ollama server runs in parallel
+        slots = _request_slots[loop] = asyncio.Semaphore(int(os.getenv("OLLAMA_NUM_PARALLEL", "4")))
+    return slots
+
+# Whether each model supports native function calling, filled by definite probe results only
+_function_calling: dict[str, bool] = {}
+
+# Semantic response caches, one VectorDB per directory shared by every AIModel
+# of that model, so pooled instances see each other's entries
+_response_caches: dict[str, object] = {}
+_response_caches_lock = threading.Lock()
+
+def shared_response_cache(persist_dir: str):
+    """Return the VectorDB for a response cache directory, opening it on first use"""
+    with _response_caches_lock:
+        cache = _response_caches.get(persist_dir)
+        if cache is None:
+            # Imported here: chromadb and sentence-transformers are only needed when the cache is on
+            from ollama_agent.server.vector_db import VectorDB
+            cache = _response_caches[persist_dir] = VectorDB(persist_dir=persist_dir)
+        return cache
 
 class AIModel:
     """
@@ -12,19 +80,45 @@ class AIModel:
     This class should be extended by specific AI model implementations.
     """
 
-    def __init__(self, model_name: str, temperature: float = 0.1, max_tokens: int = 1000, system_instruction: str = "", available_functions: list = [], max_history_length: int = 15):
+    SNAPSHOT_EVERY = 10  # Chat turns appended to the memory log before it is compacted
+    SEMANTIC_CACHE_MAX_DISTANCE = 0.075  # Cosine distance, i.e. cosine similarity >= 0.925
+    __slots__ = (
+        'model_name', 'temperature', 'max_tokens', 'system_instruction', 'available_functions',
+        'max_history_length', '_sys_msg', 'history', '_turns_since_snapshot',
+        'prompt_eval_count', 'no_of_tokens', 'eval_duration', 'tool_calls', '_disk_history', '_memory_mtime',
+        'semantic_cache', '_sem_cache', 'script_dir', 'data_dir', 'memory_file',
+    )
+
+    def __init__(self, model_name: str, temperature: float = 0.1, max_tokens: int = 1000, system_instruction: str = "", available_functions: list | None = None, max_history_length: int = 15, semantic_cache: bool | None = None):
         """
         
         Initialize the AI model with the given parameters.
+
+        semantic_cache answers chat messages that are near-duplicates of earlier
+        ones from a vector store instead of the model; it defaults to the
+        OLLAMA_AGENT_SEMANTIC_CACHE environment variable.
         """
         self.model_name = model_name
         self.temperature = temperature
         self.max_tokens = max_tokens
-        self.client = Client("http://localhost:11434")
         self.system_instruction = system_instruction
-        self.avaliable_functions = available_functions
-        self.history = []
+        self.available_functions = available_functions if available_functions is not None else []
         self.max_history_length = max_history_length
+        # The system message is pinned; the deque holds the rest of the history
+        # and drops its oldest message once the limit is reached
+        self._sys_msg = {'role': 'system', 'content': system_instruction}
+        self.history: deque = deque(maxlen=max_history_length - 1)
+        self._turns_since_snapshot = 0
+        # Generation statistics of the last model reply
+        self.prompt_eval_count = self.no_of_tokens = self.eval_duration = 0
+        self.tool_calls: list[dict] = []  # Native tool calls in the last reply
+        # Full history as stored on disk, and the (mtime_ns, size) of the snapshot and log it was read at
+        self._disk_history: list | None = None
+        self._memory_mtime: tuple | None = None
+        if semantic_cache is None:
+            semantic_cache = os.getenv("OLLAMA_AGENT_SEMANTIC_CACHE", "false").lower() == "true"
+        self.semantic_cache = semantic_cache
+        self._sem_cache = None  # Shared VectorDB, looked up on first use
         
         # Set up the data directory path for memory storage
         self.script_dir = Path(__file__).parent.parent.parent.parent  # Go up one level from agent/ to project root
@@ -37,24 +131,45 @@ class AIModel:
         # Load existing memory if it exists
         self.load_memory()
 
-    def generate_response(self, prompt: str) -> str:
+    async def generate_response(self, prompt: str) -> str:
         """
         Generate a response based on the provided prompt without memory.
         """
-        response = self.client.generate(
-            model=self.model_name,
-            prompt=prompt,
-            system=self.system_instruction,
-        )
+        async with request_slots():
+            response = await shared_async_client().generate(
+                model=self.model_name,
+                prompt=prompt,
+                system=self.system_instruction,
+            )
         # Fix: Use 'response' key instead of 'message'['content']
         return response['response']
     
-    def chat(self, message: str, isCallTool: bool = False) -> str:
+    async def chat(self, message: str, isCallTool: bool = False, no_cache: bool = False) -> str | dict:
         """
         Generate a chat response based on the provided messages and available functions.
+
+        Returns the reply text, or, when the model made native tool calls, a dict
+        shaped like Ollama's response: {'message': {'content': ..., 'tool_calls': [...]}}.
+
+        Tool-result turns (isCallTool) and calls with no_cache=True always go to
+        the model, even when the semantic cache is enabled.
+        """
+        content = ''.join([chunk async for chunk in self.chat_stream(message, isCallTool, no_cache)])
+        if self.tool_calls:
+            return {'message': {'role': 'assistant', 'content': content, 'tool_calls': self.tool_calls}}
+        return content
+
+    async def chat_stream(self, message: str, isCallTool: bool = False, no_cache: bool = False) -> AsyncIterator[str]:
+        """
+        Stream a chat response, yielding the text as the model generates it.
+
+        The full reply is added to the history and memory file once the
+        stream ends, and any native tool calls in it are left in tool_calls.
+        Arguments are the same as for chat().
         """
         if not message:
             raise ValueError("Messages string cannot be empty.")
+        self.tool_calls = []
 
         if isCallTool:
             self.history[-1] = {'role': 'assistant', 'content': message}
@@ -62,65 +177,124 @@ class AIModel:
         # Load latest memory state
         self.load_memory()
         
-        # Check if system role exists in history, if not add it
-        has_system_role = any(msg.get('role') == 'system' for msg in self.history)
-        if not has_system_role:
-            self.history.insert(0, {'role': 'system', 'content': self.system_instruction})
-        
         # Append user message to history
-        self.history.append({'role': 'user', 'content': message})
+        user_msg = {'role': 'user', 'content': message}
+        self.history.append(user_msg)
         
-        # Use the full history for the chat
-        messages = self.history.copy()
+        use_cache = self.semantic_cache and not (isCallTool or no_cache)
+        assistant_message = await self._cached_response(message) if use_cache else None
 
-        response = self.client.chat(
-            model=self.model_name,
-            messages=messages,
-            tools=self.avaliable_functions,
-            stream=False
-        )
+        if assistant_message is not None:
+            yield assistant_message
+        else:
+            # Use the full history for the chat
+            messages = self._messages()
+            parts = []
+
+            async with request_slots():
+                stream = await shared_async_client().chat(
+                    model=self.model_name,
+                    messages=messages,
+                    tools=self.available_functions,
+                    stream=True
+                )
+                async for chunk in stream:
+                    content = chunk.message.content if chunk.message else None
+                    if content:
+                        parts.append(content)
+                        yield content
+                    if chunk.message and chunk.message.tool_calls:
+                        self.tool_calls.extend(
+                            {'function': {'name': call.function.name, 'arguments': dict(call.function.arguments)}}
+                            for call in chunk.message.tool_calls
+                        )
+                    if chunk.done:
+                        # Only the final chunk carries the generation statistics
+                        self.prompt_eval_count = getattr(chunk, 'prompt_eval_count', 0) or 0
+                        self.no_of_tokens = getattr(chunk, 'eval_count', 0) or 0
+                        self.eval_duration = getattr(chunk, 'eval_duration', 0) or 0
+
+            assistant_message = ''.join(parts)
+            if use_cache and assistant_message and not self.tool_calls:
+                await self._cache_response(message, assistant_message)
 
         try:
-            # Parse the JSON string returned by model_dump_json()
-            response_json_str = response.model_dump_json()
-            response_data:dict = json.loads(response_json_str)
-            
-            # Access response data safely
-            self.prompt_eval_count = response_data.get('prompt_eval_count', 0)
-            assistant_message = response_data.get('message', {}).get('content', '')
-            self.no_of_tokens = response_data.get('eval_count', 0)
-            self.eval_duration = response_data.get('eval_duration', 0)
-            
-            # Update history safely
-            if len(self.history) > 1:
-                self.history[1]['content'] = str(self.no_of_tokens)
-            
-            # Append assistant response to history
-            self.history.append({
-                'role': 'assistant',
-                'content': assistant_message
-            })
-            
-            # Check if history exceeds max length and truncate if needed
-            if self.size_of_memory() > self.max_history_length:
-                self.history = [self.history[0]] + self.history[-(self.max_history_length-1):]
-            
-            # Save updated history to memory
-            with open(self.memory_file, 'w') as f:
-                json.dump(self.history, f, indent=2)
-            return assistant_message
+            # History is updated here on the event loop; only the file write runs in a thread
+            write_memory = self._record_reply(user_msg, assistant_message)
+            await asyncio.to_thread(write_memory)
         except Exception as e:
-            print(f"Error parsing response: {e}")
-            # Use the correct attribute for response content
-            print(f"Response message: {response.message.content if hasattr(response, 'message') else 'No message content'}")   
-            return "Error: Failed to get response from model"
+            print(f"Error saving response to memory: {e}")
+
+    def _record_reply(self, user_msg: dict, assistant_message: str) -> Callable[[], None]:
+        """
+        Add the assistant's reply to the history.
+
+        Returns:
+            A function that writes the turn to the memory file
+        """
+        # Update the token count entry, if the history has one; it is persisted with the next snapshot
+        if self.history and self.history[0].get('role') == 'token_count':
+            self.history[0]['content'] = str(self.no_of_tokens)
+        
+        # Append assistant response to history; the deque drops the oldest message past the limit
+        turn = [user_msg, {'role': 'assistant', 'content': assistant_message}]
+        self.history.append(turn[1])
+        
+        # Log this turn's messages; compact the log into a fresh snapshot every few turns
+        if self._disk_history is not None:
+            self._disk_history.extend(turn)
+        self._turns_since_snapshot += 1
+        if self._turns_since_snapshot >= self.SNAPSHOT_EVERY:
+            self._turns_since_snapshot = 0
+            return partial(self._compact_memory, turn)
+        return partial(self._write_memory, append_history, turn)
+
+    def _response_cache(self):
+        """Return the semantic response cache, opening it on first use"""
+        if self._sem_cache is None:
+            safe_name = self.model_name.replace("/", "_").replace(":", "_")
+            self._sem_cache = shared_response_cache(str(self.data_dir / "response_cache" / safe_name))
+        return self._sem_cache
+
+    async def _cached_response(self, message: str) -> str | None:
+        """Return the stored response to a near-identical earlier message, if any"""
+        def lookup():
+            cache = self._response_cache()
+            hit = cache.query(text=message, n_results=1)
+            max_distance = self.SEMANTIC_CACHE_MAX_DISTANCE
+            if cache.space == "l2":
+                max_distance *= 2  # Caches created before cosine indexes: squared L2 of unit vectors is 2x the cosine distance
+            if hit["distances"] and hit["distances"][0] and hit["distances"][0][0] < max_distance:
+                return (hit["metadatas"][0][0] or {}).get("response")
+            return None
+        # Embedding runs on the CPU, so keep it off the event loop
+        return await asyncio.to_thread(lookup)
+
+    async def _cache_response(self, message: str, response: str) -> None:
+        """Store a model response for later near-duplicate messages"""
+        await self._response_cache().add_async([message], metadatas=[{"response": response}])
+
+    async def chat_many(self, messages: list[str]) -> list[str | dict]:
+        """
+        Send several chat messages concurrently, at most OLLAMA_NUM_PARALLEL at a time.
+        
+        Replies are returned in the order of messages; they are added to the
+        shared history in the order they complete.
+        """
+        return list(await asyncio.gather(*(self.chat(message) for message in messages)))
 
     @staticmethod
     def function_call_avaliablity(model) -> bool:
         """
         This function checks if the model supports function calling.
+        The probe is a full chat round-trip, so a definite answer is cached per
+        model name. Other errors, such as a model that is not pulled yet or a
+        server that is unreachable, are raised and the next call probes again.
         """
-        client = Client("http://localhost:11434")
+        supported = _function_calling.get(model)
+        if supported is not None:
+            return supported
+        client = shared_client()
 
         try:
             client.chat(
@@ -140,32 +314,51 @@ class AIModel:
                     }
                 }
             }])
-            return True
-        except ResponseError:
-            return False
+            supported = True
+        except ResponseError as e:
+            if "does not support tools" not in str(e.error):
+                raise
+            supported = False
+        _function_calling[model] = supported
+        return supported
     
     def kill_ollama_processes(self) -> None:
-        """Terminate all running ollama.exe processes"""
+        """Terminate all running ollama processes"""
         try:
             if not self.is_ollama_running():
-                print("✅ No running ollama.exe processes found.")
+                print("✅ No running ollama processes found.")
                 return
-            # Use taskkill to terminate all instances of ollama.exe
-            print("🛑 Terminating all running ollama.exe processes...")
-            # /F = force, /IM = image name
-            subprocess.run(["taskkill", "/F", "/IM", "ollama.exe"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            print("✅ All ollama.exe processes have been terminated.")
+            print("🛑 Terminating all running ollama processes...")
+            if os.name == 'nt':
+                # /F = force, /IM = image name
+                command = ["taskkill", "/F", "/IM", "ollama.exe"]
+            else:
+                # Anchored so the ollama-agent CLI running this code is not matched
+                command = ["pkill", "-f", "(^|/)ollama( |$)"]
+            subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            print("✅ All ollama processes have been terminated.")
         except subprocess.CalledProcessError as e:
-            print("⚠️ No ollama.exe processes were running or failed to terminate.")
+            print("⚠️ No ollama processes were running or failed to terminate.")
+            print(e)
+        except OSError as e:
+            # FileNotFoundError included: taskkill/pkill is not installed
+            print("⚠️ Could not run the process kill command.")
             print(e)
 
     def is_ollama_running(self) -> bool:
-        """Check if any ollama.exe process is running"""
-        
-        for proc in psutil.process_iter(['name']):
-            if proc.info['name'] and proc.info['name'].lower() == 'ollama.exe':
-                return True
-        return False
+        """Check if any ollama process is running"""
+        # One filtered OS query instead of walking every process
+        try:
+            if os.name == 'nt':
+                result = subprocess.run(
+                    ["tasklist", "/FI", "IMAGENAME eq ollama.exe", "/NH", "/FO", "CSV"],
+                    capture_output=True, text=True,
+                )
+                return "ollama.exe" in result.stdout.lower()
+            result = subprocess.run(["pgrep", "-x", "ollama"], capture_output=True)
+            return result.returncode == 0
+        except FileNotFoundError:
+            return False
     
     @staticmethod
     def list_ollama_models() -> None:
@@ -176,37 +369,91 @@ class AIModel:
             print("⚠️ Failed to list models.")
             print(result.stderr)
 
+    def _memory_stamp(self) -> tuple:
+        """(mtime_ns, size) of the memory snapshot and log, None for a missing file"""
+        stamps = []
+        for path in (self.memory_file, memory_log_path(self.memory_file)):
+            try:
+                st = os.stat(path)
+                stamps.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def _messages(self) -> list:
+        """The conversation as sent to the model: the system message, then the history"""
+        return [self._sys_msg, *self.history]
+
+    def _set_history(self, messages: list) -> None:
+        """Replace the history with messages, pinning the first system message among them"""
+        system = None
+        self.history.clear()
+        for message in messages:
+            if message.get('role') != 'system':
+                self.history.append(message)
+            elif system is None:
+                system = message
+        self._sys_msg = system or {'role': 'system', 'content': self.system_instruction}
+
+    def _write_memory(self, write: Callable[[Path, list], None], messages: list) -> None:
+        """
+        Write messages with save_history or append_history and note the files' new stamp.
+
+        After an append the new stamp is only adopted if the files were still as
+        this instance last saw them; otherwise another writer got in between,
+        and the stamp is dropped so the next load_memory() re-reads the files.
+        """
+        with memory_lock(self.memory_file):
+            unchanged = write is save_history or self._memory_stamp() == self._memory_mtime
+            write(self.memory_file, messages)
+            self._memory_mtime = self._memory_stamp() if unchanged else None
+
+    def _compact_memory(self, turn: list) -> None:
+        """Append turn, then merge the log with everything other writers added into a new snapshot"""
+        with memory_lock(self.memory_file):
+            append_history(self.memory_file, turn)
+            self._disk_history = compact_history(self.memory_file, self._trim_history)
+            self._memory_mtime = self._memory_stamp()
+
+    def _trim_history(self, messages: list) -> list:
+        """Cut messages to what the history holds: the first system message, then the latest others"""
+        system = next((m for m in messages if m.get('role') == 'system'), self._sys_msg)
+        rest = [m for m in messages if m.get('role') != 'system']
+        rest = rest[-(self.max_history_length - 1):] if self.max_history_length > 1 else []
+        if rest and rest[0].get('role') == 'token_count':
+            # The in-memory count is newer than the logged one
+            rest[0] = {**rest[0], 'content': str(self.no_of_tokens)}
+        return [system, *rest]
+
+    def _save_snapshot(self) -> None:
+        """Write the current history as the memory snapshot and remember it as the on-disk state"""
+        self._disk_history = self._messages()
+        self._write_memory(save_history, self._disk_history)
+        self._turns_since_snapshot = 0
+
     def load_memory(self) -> bool:
         try:
-            with open(self.memory_file, 'r') as f:
-                self.history = json.load(f)
-                if self.size_of_memory() > self.max_history_length:
-                    self.history = self.history[-self.max_history_length:]
-                    with open(self.memory_file, 'w') as f:
-                        json.dump(self.history, f, indent=2)
+            # Only parse the files again when something else has written to them since
+            stamp = self._memory_stamp()
+            if self._disk_history is None or stamp != self._memory_mtime:
+                self._disk_history = load_history(self.memory_file)
+                self._memory_mtime = stamp
+            self._set_history(self._disk_history[-self.max_history_length:])
             return True
         except FileNotFoundError:
             # Create new empty memory file if it doesn't exist
             print(f"Memory file not found. Creating new memory file at {self.memory_file}")
-            self.history = []
-            with open(self.memory_file, 'w') as f:
-                json.dump(self.history, f, indent=2)
+            self.history.clear()
+            self._save_snapshot()
             return True
         except Exception as e:
             print(f"Error loading memory: {e}")
             return False
 
     def size_of_memory(self) -> int:
-        return len(self.history)
+        return len(self.history) + 1  # The pinned system message
 
     def clear_memory(self) -> None:
-        message: dict
-        self.history_new = []
-        for message in self.history:
-            if message['role'] == 'system' or message['role'] == 'token_count':
-                if message.get('role') == "token_count":
-                    message['content'] = "0"
-                self.history_new.append(message)
-        self.history = self.history_new
-        with open(self.memory_file, 'w') as f:
-            json.dump(self.history, f, indent=2)
\ No newline at end of file
+        # Keep the system message and the token count entry
+        self._set_history(keep_system_messages(self._messages()))
+        self._save_snapshot()
\ No newline at end of file
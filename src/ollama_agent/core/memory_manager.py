@@ -5,14 +5,122 @@ Provides easy access to memory operations without creating a full AI model insta
 """
 
 from .model_loader import ModelConfigLoader
+from collections import Counter, deque
 from pathlib import Path
-import json
+from . import json_compat
+from typing import Callable
+import os
+import threading
+
+# Conversation memory is a JSON snapshot (memory.json) plus an append-only
+# log of the messages added since (memory.jsonl), so a chat turn writes only
+# its new messages instead of rewriting the whole history.
+
+# Writers in this process (several AIModel instances, threaded writes) take the
+# lock of the snapshot they write, so an append never lands between another
+# writer's read of the log and its removal of it.
+_LOCKS: dict[str, threading.RLock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+def memory_lock(memory_file: Path) -> threading.RLock:
+    """Return the lock guarding writes to a memory snapshot and its log."""
+    key = os.path.abspath(memory_file)
+    with _LOCKS_GUARD:
+        lock = _LOCKS.get(key)
+        if lock is None:
+            lock = _LOCKS[key] = threading.RLock()
+        return lock
+
+def memory_log_path(memory_file: Path) -> Path:
+    """Return the append log that accompanies a memory snapshot file."""
+    return Path(memory_file).with_suffix('.jsonl')
+
+def load_history(memory_file: Path, max_messages: int | None = None) -> list:
+    """
+    Load the conversation history: the snapshot followed by the logged messages.
+
+    Args:
+        memory_file: Path of the memory.json snapshot
+        max_messages: If given, only the most recent max_messages are returned
+
+    Raises:
+        FileNotFoundError: If neither the snapshot nor the log exists
+    """
+    log_file = memory_log_path(memory_file)
+    try:
+        with open(memory_file, 'rb') as f:
+            history = json_compat.loads(f.read())
+    except FileNotFoundError:
+        if not log_file.exists():
+            raise
+        history = []
+
+    try:
+        with open(log_file, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    history.append(json_compat.loads(line))
+                except json_compat.JSONDecodeError:
+                    break  # Partially written last line
+    except FileNotFoundError:
+        pass
+
+    if max_messages is not None and len(history) > max_messages:
+        history = list(deque(history, maxlen=max_messages))
+    return history
+
+def append_history(memory_file: Path, messages: list) -> None:
+    """Append messages to the memory log without rewriting the snapshot."""
+    data = b"".join(json_compat.dumps(message) + b"\n" for message in messages)
+    with memory_lock(memory_file), open(memory_log_path(memory_file), 'ab') as f:
+        f.write(data)
+
+def save_history(memory_file: Path, history: list) -> None:
+    """Write history as the new snapshot atomically and empty the log."""
+    tmp_file = Path(memory_file).with_suffix('.json.tmp')
+    with memory_lock(memory_file):
+        with open(tmp_file, 'wb') as f:
+            f.write(json_compat.dumps(history))
+        os.replace(tmp_file, memory_file)
+        try:
+            os.remove(memory_log_path(memory_file))
+        except FileNotFoundError:
+            pass
+
+def compact_history(memory_file: Path, trim: Callable[[list], list] | None = None) -> list:
+    """
+    Merge the log into a fresh snapshot and return the snapshot written.
+
+    The snapshot and log are re-read under the memory lock, so messages other
+    writers appended are kept rather than overwritten.
+
+    Args:
+        memory_file: Path of the memory.json snapshot
+        trim: Optional function cutting the merged history down before it is saved
+    """
+    with memory_lock(memory_file):
+        history = load_history(memory_file)
+        if trim is not None:
+            history = trim(history)
+        save_history(memory_file, history)
+        return history
+
+def keep_system_messages(history: list) -> list:
+    """Return the system and token_count messages of history, with the token count reset to "0"."""
+    return [
+        {**message, 'content': "0"} if message.get('role') == 'token_count' else message
+        for message in history
+        if message.get('role') in ('system', 'token_count')
+    ]
 
 class MemoryManager:
     """
     Memory management system for the Ollama Agent.
     Handles loading, saving, and managing conversation history.
     """
+    __slots__ = ('script_dir', 'data_dir', 'memory_file', 'loader')
     
     def __init__(self, model_loader=None) -> None:
         """Initialize the memory manager with default paths."""
@@ -37,34 +145,24 @@ class MemoryManager:
         """
         try:
             # Load existing memory
-            with open(self.memory_file, 'r') as f:
-                history = json.load(f)
+            history = load_history(self.memory_file)
             
             if keep_system_prompt:
-                # Keep only system and token_count messages
-                new_history = []
-                message: dict
-                for message in history:
-                    if message.get('role') in ['system', 'token_count']:
-                        if message.get('role') == "token_count":
-                            message['content'] = "0"
-                        new_history.append(message)
-                history = new_history
+                # Keep only system and token_count messages, with the token count reset
+                history = keep_system_messages(history)
             else:
                 # Clear everything
                 history = []
             
             # Save cleared memory
-            with open(self.memory_file, 'w') as f:
-                json.dump(history, f, indent=2)
+            save_history(self.memory_file, history)
             
             print(f"✅ Memory cleared successfully! {'(System prompt preserved)' if keep_system_prompt else '(Complete clear)'}")
             return True
             
         except FileNotFoundError:
             print("📝 No memory file found - creating empty memory")
-            with open(self.memory_file, 'w') as f:
-                json.dump([], f, indent=2)
+            save_history(self.memory_file, [])
             return True
         except Exception as e:
             print(f"❌ Error clearing memory: {e}")
@@ -73,8 +171,7 @@ class MemoryManager:
     def view_memory(self) -> None:
         """View current memory contents"""
         try:
-            with open(self.memory_file, 'r') as f:
-                history = json.load(f)
+            history = load_history(self.memory_file)
             
             if not history:
                 print("📝 Memory is empty")
@@ -97,14 +194,15 @@ class MemoryManager:
     def get_memory_stats(self) -> dict:
         """Get memory statistics"""
         try:
-            with open(self.memory_file, 'r') as f:
-                history = json.load(f)
+            history = load_history(self.memory_file)
             
+            # Count every role in one pass over the history
+            roles = Counter(m.get('role') for m in history)
             stats = {
                 'total_messages': len(history),
-                'user_messages': len([m for m in history if m.get('role') == 'user']),
-                'assistant_messages': len([m for m in history if m.get('role') == 'assistant']),
-                'system_messages': len([m for m in history if m.get('role') == 'system'])
+                'user_messages': roles['user'],
+                'assistant_messages': roles['assistant'],
+                'system_messages': roles['system']
             }
             
             print("📊 Memory Statistics:")
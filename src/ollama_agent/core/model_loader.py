@@ -4,13 +4,15 @@ Model Configuration Loader
 Utility for loading and managing model configurations from model.json
 """
 
-import json
 import os
 from pathlib import Path
 from typing import Dict, Any, Optional, List
+from . import json_compat
 
 class ModelConfigLoader:
     """Load and manage model configurations from model.json"""
+    __slots__ = ('config_path', 'config')
+    _CACHE: Dict[str, Dict[str, Any]] = {}  # Parsed configs keyed by path, shared by all loaders
     
     def __init__(self, config_path: Optional[str] = None):
         """
@@ -27,17 +29,26 @@ class ModelConfigLoader:
         
         self.config = self._load_config()
     
+    @classmethod
+    def invalidate(cls) -> None:
+        """Forget cached configurations so the next loader reads the file again"""
+        cls._CACHE.clear()
+    
     def _load_config(self) -> Dict[str, Any]:
-        """Load configuration from JSON file"""
+        """Load configuration from JSON file, parsing each file once per process"""
+        key = str(self.config_path)
+        if key in self._CACHE:
+            return self._CACHE[key]
         try:
-            with open(self.config_path, 'r') as f:
-                config = json.load(f)
+            with open(self.config_path, 'rb') as f:
+                config = json_compat.loads(f.read())
                 print(f"✅ Loaded model configuration from {self.config_path}")
+                self._CACHE[key] = config
                 return config
         except FileNotFoundError:
             print(f"❌ Model configuration file not found: {self.config_path}")
             return self._get_fallback_config()
-        except json.JSONDecodeError as e:
+        except json_compat.JSONDecodeError as e:
             print(f"❌ Error parsing model configuration: {e}")
             return self._get_fallback_config()
     
@@ -1,8 +1,12 @@
 from mcp.server.fastmcp import FastMCP
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
 import subprocess
 import os
 import platform
+import re
+from functools import lru_cache
 from ollama_agent.server.vector_db import VectorDB
 
 # Try to load dotenv, but don't fail if it's not available
@@ -15,6 +19,20 @@ except ImportError:
 # Create an MCP server
 mcp = FastMCP("Search Service")
 
+# Reuse connections to the search API between calls instead of a new TLS handshake per query
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
+_SEPARATOR = "-" * 50  # Rule between sections of tool output
+
+# Security: substrings that block a CLI command, matched in one pass
+DANGEROUS_COMMANDS = (
+    'rm -rf', 'del /f /s /q', 'format', 'fdisk', 'mkfs',
+    'shutdown', 'reboot', 'halt', 'poweroff', 'sudo rm',
+    'dd if=', 'chmod 777', 'chown -R'
+)
+_DANGEROUS_RE = re.compile('|'.join(re.escape(s) for s in DANGEROUS_COMMANDS), re.IGNORECASE)
+
 @mcp.tool(description="Perform a Google search and return relevant results.")
 def google_search(query: str) -> str:
     """
@@ -43,7 +61,7 @@ def google_search(query: str) -> str:
             "num": 5
         }
         
-        response = requests.get(url, params=params, timeout=10)
+        response = _SESSION.get(url, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -69,23 +87,44 @@ def google_search(query: str) -> str:
             })
         
         # Create a well-structured result format
-        result_text = f"🔍 Google Search Results for '{query}'\n"
-        result_text += f"Found {len(results)} results:\n\n"
+        parts = [f"🔍 Google Search Results for '{query}'\nFound {len(results)} results:\n\n"]
         
         for i, result in enumerate(results, 1):
-            result_text += f"📄 Result {i}:\n"
-            result_text += f"Title: {result['title']}\n"
-            result_text += f"Summary: {result['snippet']}\n"
-            result_text += f"Link: {result['url']}\n"
-            result_text += "-" * 50 + "\n\n"
+            parts.append(
+                f"📄 Result {i}:\n"
+                f"Title: {result['title']}\n"
+                f"Summary: {result['snippet']}\n"
+                f"Link: {result['url']}\n"
+                f"{_SEPARATOR}\n\n"
+            )
         
-        return result_text
+        return "".join(parts)
         
     except Exception as e:
         return f"❌ Error performing Google search: {str(e)}"
 
+def _run_cli(command: str, cwd: str, timeout: int) -> subprocess.CompletedProcess:
+    """Run a command in the platform shell and capture its output."""
+    # Determine shell based on OS
+    is_windows = platform.system() == "Windows"
+    
+    if is_windows:
+        # On Windows, use cmd.exe
+        args = ["cmd", "/c", command]
+    else:
+        # On Unix-like systems, use bash
+        args = ["bash", "-c", command]
+    return subprocess.run(
+        args,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+        shell=False
+    )
+
 @mcp.tool(description="Execute a command line interface (CLI) command and return its output.")
-def execute_cli_command(command: str, working_directory: str = "", timeout: int = 30) -> str:
+async def execute_cli_command(command: str, working_directory: str = "", timeout: int = 30) -> str:
     """
     Execute a CLI command and return its output.
     
@@ -99,64 +138,36 @@ def execute_cli_command(command: str, working_directory: str = "", timeout: int
     """
     try:
         # Security: Basic command validation
-        dangerous_commands = [
-            'rm -rf', 'del /f /s /q', 'format', 'fdisk', 'mkfs',
-            'shutdown', 'reboot', 'halt', 'poweroff', 'sudo rm',
-            'dd if=', 'chmod 777', 'chown -R'
-        ]
-        
-        command_lower = command.lower()
-        for dangerous in dangerous_commands:
-            if dangerous in command_lower:
-                return f"❌ Security: Command '{command}' contains potentially dangerous operations and cannot be executed."
-        
-        # Determine shell based on OS
-        is_windows = platform.system() == "Windows"
+        if _DANGEROUS_RE.search(command):
+            return f"❌ Security: Command '{command}' contains potentially dangerous operations and cannot be executed."
         
         # Set working directory
         cwd = working_directory if working_directory != "" and os.path.exists(working_directory) else os.getcwd()
         
-        # Execute command
-        if is_windows:
-            # On Windows, use cmd.exe
-            result = subprocess.run(
-                ["cmd", "/c", command],
-                cwd=cwd,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                shell=False
-            )
-        else:
-            # On Unix-like systems, use bash
-            result = subprocess.run(
-                ["bash", "-c", command],
-                cwd=cwd,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                shell=False
-            )
+        # Execute command in a worker thread so the server keeps handling other requests meanwhile
+        result = await asyncio.to_thread(_run_cli, command, cwd, timeout)
         
         # Format the output
-        output_text = f"💻 CLI Command Execution\n"
-        output_text += f"Command: {command}\n"
-        output_text += f"Working Directory: {cwd}\n"
-        output_text += f"Exit Code: {result.returncode}\n"
-        output_text += "-" * 50 + "\n\n"
+        parts = [
+            "💻 CLI Command Execution\n"
+            f"Command: {command}\n"
+            f"Working Directory: {cwd}\n"
+            f"Exit Code: {result.returncode}\n"
+            f"{_SEPARATOR}\n\n"
+        ]
         
         if result.stdout:
-            output_text += f"📄 Output:\n{result.stdout}\n"
+            parts.append(f"📄 Output:\n{result.stdout}\n")
         
         if result.stderr:
-            output_text += f"⚠️ Error Output:\n{result.stderr}\n"
+            parts.append(f"⚠️ Error Output:\n{result.stderr}\n")
         
         if result.returncode == 0:
-            output_text += "✅ Command executed successfully"
+            parts.append("✅ Command executed successfully")
         else:
-            output_text += f"❌ Command failed with exit code {result.returncode}"
+            parts.append(f"❌ Command failed with exit code {result.returncode}")
         
-        return output_text
+        return "".join(parts)
         
     except subprocess.TimeoutExpired:
         return f"⏰ Command '{command}' timed out after {timeout} seconds"
@@ -189,53 +200,52 @@ def list_directory(path: str = ".", show_hidden: bool = False) -> str:
         # Get absolute path for clarity
         abs_path = os.path.abspath(path)
         
-        # List directory contents
-        items = os.listdir(abs_path)
-        
-        # Filter hidden files if requested
-        if not show_hidden:
-            items = [item for item in items if not item.startswith('.')]
+        # List directory contents, filtering hidden files if requested;
+        # scandir entries carry the file type, so only files need a stat call
+        with os.scandir(abs_path) as it:
+            entries = [entry for entry in it if show_hidden or not entry.name.startswith('.')]
+        entries.sort(key=lambda entry: entry.name)
         
         # Sort items (directories first, then files)
         directories = []
         files = []
         
-        for item in sorted(items):
-            item_path = os.path.join(abs_path, item)
-            if os.path.isdir(item_path):
-                directories.append(f"📁 {item}/")
+        for entry in entries:
+            if entry.is_dir():
+                directories.append(f"📁 {entry.name}/")
             else:
-                file_size = os.path.getsize(item_path)
-                size_str = f"({file_size} bytes)"
-                files.append(f"📄 {item} {size_str}")
+                size_str = f"({entry.stat().st_size} bytes)"
+                files.append(f"📄 {entry.name} {size_str}")
         
         # Format output
-        output_text = f"📂 Directory Listing: {abs_path}\n"
-        output_text += "-" * 50 + "\n"
+        parts = [f"📂 Directory Listing: {abs_path}\n{_SEPARATOR}\n"]
         
         if directories:
-            output_text += "Directories:\n"
-            for dir_item in directories:
-                output_text += f"  {dir_item}\n"
-            output_text += "\n"
+            parts.append("Directories:\n")
+            parts.extend(f"  {dir_item}\n" for dir_item in directories)
+            parts.append("\n")
         
         if files:
-            output_text += "Files:\n"
-            for file_item in files:
-                output_text += f"  {file_item}\n"
+            parts.append("Files:\n")
+            parts.extend(f"  {file_item}\n" for file_item in files)
         
         if not directories and not files:
-            output_text += "Directory is empty\n"
+            parts.append("Directory is empty\n")
         
-        output_text += f"\nTotal: {len(directories)} directories, {len(files)} files"
+        parts.append(f"\nTotal: {len(directories)} directories, {len(files)} files")
         
-        return output_text
+        return "".join(parts)
         
     except PermissionError:
         return f"❌ Permission denied: Cannot access directory '{path}'"
     except Exception as e:
         return f"❌ Error listing directory '{path}': {str(e)}"
 
+@lru_cache(maxsize=128)
+def _get_db(user_id: str) -> VectorDB:
+    """Return the user's memory store, opened once and reused across calls."""
+    return VectorDB(persist_dir=f"./user_memory_db/{user_id}")
+
 @mcp.tool(description="Manage user memory using the vector database.")
 def get_memory(user_id: str, action: str, text: str) -> str:
     """
@@ -252,7 +262,7 @@ def get_memory(user_id: str, action: str, text: str) -> str:
     if action not in ["save", "load"]:
         return "❌ Invalid action. Use 'save' or 'load'."
     
-    db = VectorDB(persist_dir=f"./user_memory_db/{user_id}")
+    db = _get_db(user_id)
 
     if action == "save":
         db.add([text])
@@ -1,63 +1,372 @@
+import asyncio
 import chromadb
 import hashlib
+import numpy as np
+import torch
+from functools import lru_cache
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 import os
+import queue
+import threading
+
+# xxhash is optional; without it only the hashlib algorithms are available
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 load_dotenv()
+_IS_DEBUG = os.getenv("DEBUG", "false").lower() == "true"  # Read once; .env is loaded just above
+
+# HNSW index settings for new collections. Embeddings are normalized, so cosine
+# distance ranks like the inner product; larger M and construction_ef trade
+# build time for recall, search_ef sets the per-query recall/latency balance.
+_HNSW_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+    "hnsw:batch_size": 1000,
+    "hnsw:sync_threshold": 10000,
+}
+
+# Collections up to this size are searched with one matrix-vector product over
+# an in-memory copy of their embeddings instead of a round-trip to Chroma.
+# Overridden per instance with scan_max_docs; 0 always uses the HNSW index
+_SCAN_MAX_DOCS = 10_000
+
+# IDs per get/delete call that names IDs; keeps each query under SQLite's bound-variable limit
+_ID_BATCH_SIZE = 500
+
+# Documents per encode-and-store step when add() pipelines a large batch
+_ADD_CHUNK_SIZE = 512
+
+# Loaded models keyed by (model_name, device, backend), shared by every VectorDB in the process
+_MODEL_CACHE: dict[tuple[str, str, str], SentenceTransformer] = {}
+
+# Dynamically quantized INT8 export for CPUs with AVX-512 VNNI, published alongside the MiniLM models
+_ONNX_INT8_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+# 128-bit hex digests for document IDs, keyed by the hash_algo VectorDB accepts
+_HASHERS = {
+    "md5": lambda data: hashlib.md5(data).hexdigest(),
+    "blake2b": lambda data: hashlib.blake2b(data, digest_size=16).hexdigest(),
+}
+if xxhash is not None:
+    _HASHERS["xxh3"] = xxhash.xxh3_128_hexdigest
+
+def _pick_device() -> str:
+    """Return the fastest available torch device: CUDA, then Apple MPS, then CPU."""
+    if torch.cuda.is_available():
+        return "cuda"
+    mps = getattr(torch.backends, "mps", None)
+    if mps is not None and mps.is_available():
+        return "mps"
+    return "cpu"
+
+# Small bound: the cache keys on the full document text, and hashing is cheap
+# next to keeping many large documents alive for the life of the process
+@lru_cache(maxsize=1024)
+def _stable_id(text: str, hash_algo: str = "md5") -> str:
+    """Generate a stable unique ID from text; recently repeated texts skip the hashing."""
+    # No ASCII fast path: str.lower() and encode() on ASCII text are already tight
+    # loops, and extra isascii()/islower() checks measured slower than this
+    return _HASHERS[hash_algo](text.lower().encode("utf-8"))
 
 class VectorDB:
-    def __init__(self, persist_dir: str = "./chroma_db", model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, persist_dir: str = "./chroma_db", model_name: str = "all-MiniLM-L6-v2", hash_algo: str = "md5", device: str | None = None, backend: str | None = None, scan_max_docs: int = _SCAN_MAX_DOCS, warmup: bool = True):
+        if hash_algo not in _HASHERS:
+            raise ValueError(f"Unsupported hash_algo '{hash_algo}', expected one of: {', '.join(_HASHERS)}")
         self.model_name = model_name
+        self.hash_algo = hash_algo
         self.client = chromadb.PersistentClient(path=persist_dir)
 
         # Use model name in collection name so embeddings stay separate
         safe_name = model_name.replace("/", "_").replace("-", "_").lower()
         self.collection_name = f"docs_{safe_name}"
+        if hash_algo != "md5":
+            # IDs differ between algorithms, so each gets its own collection instead of mixing with MD5 IDs
+            self.collection_name += f"_{hash_algo}"
+        self._sidecar_path = os.path.join(persist_dir, f"{self.collection_name}.f16.npz")
+
+        # Settings only apply when the collection is created; existing stores keep theirs
+        self.collection = self.client.get_or_create_collection(name=self.collection_name, metadata=_HNSW_METADATA)
+        self.space = (self.collection.metadata or {}).get("hnsw:space", "l2")  # Distance metric query() reports
+        self._known_ids: set[str] | None = None  # Loaded on the first add()
+        # (ids, documents, metadatas, embeddings) of the whole collection for query() to scan;
+        # None until the first query, False once the collection is too large to keep in memory
+        self._mirror: tuple | bool | None = None
+        self.scan_max_docs = scan_max_docs
+        self.device = device or _pick_device()
+        self.backend = backend or os.getenv("VECTOR_DB_BACKEND", "torch").lower()
+        key = (model_name, self.device, self.backend)
+        if key not in _MODEL_CACHE:
+            model = self._load_model(model_name)
+            # sentence-transformers loads the Rust tokenizer when the model has one; a Python
+            # tokenizer here means tokenization, not the forward pass, may dominate short texts
+            if _IS_DEBUG and not getattr(model.tokenizer, "is_fast", True):
+                self.debug_print(f"⚠️ {model_name} has no fast tokenizer; encoding short texts will be slower")
+            if warmup:
+                # The first encode sets up kernels, workspaces and device contexts; pay for it here
+                # rather than on the first query. Models from the cache are already warm
+                model.encode(["warmup"], show_progress_bar=False, convert_to_numpy=True)
+            _MODEL_CACHE[key] = model
+        self.model = _MODEL_CACHE[key]
+        # Per instance, so instances with different models never share embeddings
+        self._encode_query = lru_cache(maxsize=1024)(lambda text: self._encode([text]))
 
-        self.collection = self.client.get_or_create_collection(name=self.collection_name)
-        self.model = SentenceTransformer(model_name)
+    def _load_model(self, model_name: str) -> SentenceTransformer:
+        """Load the embedding model for this instance's device and backend."""
+        if self.backend == "onnx":
+            return self._load_onnx_model(model_name)
+        if self.device == "cpu":
+            # Some launchers start torch with a single thread; use every core for the matrix multiplies
+            torch.set_num_threads(int(os.getenv("VECTOR_DB_THREADS", os.cpu_count() or 4)))
+        model = SentenceTransformer(model_name, device=self.device)
+        if self.device == "cuda":
+            # FP16 runs on the tensor cores and halves memory traffic
+            model.half()
+        return model
+
+    def _load_onnx_model(self, model_name: str) -> SentenceTransformer:
+        """Load the model on ONNX Runtime, INT8-quantized on CPU when the model ships that export."""
+        if self.device == "cpu":
+            try:
+                return SentenceTransformer(model_name, device=self.device, backend="onnx",
+                                           model_kwargs={"file_name": _ONNX_INT8_FILE})
+            except Exception as e:
+                self.debug_print(f"⚠️ No INT8 ONNX export for {model_name}, using FP32 ONNX: {e}")
+        return SentenceTransformer(model_name, device=self.device, backend="onnx")
 
     @staticmethod
     def debug_print(input_text: str = ""):
-        IS_DEBUG = os.getenv("DEBUG", "false").lower() == "true"
-        if IS_DEBUG:
+        if _IS_DEBUG:
             print(f"DEBUG MODE Input Text: {input_text}")
-        
-    def _make_id(self, text: str) -> str:
-        """Generate a stable unique ID from text using MD5 hash."""
-        return hashlib.md5(text.lower().encode("utf-8")).hexdigest()
-
-    def add(self, docs: list[str]):
-        """Add documents, skipping duplicates."""
-        for doc in docs:
-            doc_id = self._make_id(doc)
-
-            # Check if already exists
-            existing = self.collection.get(ids=[doc_id])
-            if existing["documents"]:
-                self.debug_print(f"⚠️ Skipping duplicate: {doc[:50]}...")
+
+    def _encode(self, texts: list[str], **kwargs) -> np.ndarray:
+        """Embed texts as unit-length float32 vectors; FP16 output from a GPU model is widened once here."""
+        embeddings = self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=True, **kwargs)
+        return embeddings.astype(np.float32, copy=False)
+
+    def _known(self) -> set[str]:
+        """
+        IDs stored in the collection, kept current by add() and clear(). They are read
+        again when the collection's count differs, i.e. another instance or process
+        has written to the same store.
+        """
+        if self._known_ids is None or len(self._known_ids) != self.collection.count():
+            self._known_ids = set(self.collection.get(include=[])["ids"])
+        return self._known_ids
+
+    def add(self, docs: list[str], metadatas: list[dict] | None = None):
+        """Add documents, skipping duplicates. metadatas, if given, holds one dict per document."""
+        ids = [_stable_id(doc, self.hash_algo) for doc in docs]
+        if not ids:
+            return
+
+        known = self._known()
+        batch_ids = set()  # Also skips repeats within this batch
+        new_ids, new_docs, new_metadatas = [], [], []
+        for i, (doc_id, doc) in enumerate(zip(ids, docs)):
+            if doc_id in known or doc_id in batch_ids:
+                if _IS_DEBUG:
+                    self.debug_print(f"⚠️ Skipping duplicate: {doc[:50]}...")
                 continue
+            batch_ids.add(doc_id)
+            new_ids.append(doc_id)
+            new_docs.append(doc)
+            if metadatas is not None:
+                new_metadatas.append(metadatas[i])
+        if not new_docs:
+            return
+        if metadatas is None:
+            new_metadatas = None
+
+        if len(new_docs) <= _ADD_CHUNK_SIZE:
+            # One encode call batches the forward passes; one add stores them all
+            self._insert(new_ids, new_docs, new_metadatas, self._encode(new_docs, batch_size=64))
+            return
+
+        # Large ingests: encode the next chunk while a worker thread stores the previous one
+        pending: queue.Queue = queue.Queue(maxsize=2)
+        errors = []
+
+        def store():
+            while (chunk := pending.get()) is not None:
+                if not errors:
+                    try:
+                        self._insert(*chunk)
+                    except Exception as e:
+                        errors.append(e)
+
+        worker = threading.Thread(target=store, daemon=True)
+        worker.start()
+        try:
+            for start in range(0, len(new_docs), _ADD_CHUNK_SIZE):
+                if errors:
+                    break
+                end = start + _ADD_CHUNK_SIZE
+                chunk_docs = new_docs[start:end]
+                pending.put((
+                    new_ids[start:end],
+                    chunk_docs,
+                    new_metadatas[start:end] if new_metadatas is not None else None,
+                    self._encode(chunk_docs, batch_size=64),
+                ))
+        finally:
+            pending.put(None)
+            worker.join()
+        if errors:
+            raise errors[0]
+
+    async def add_async(self, docs: list[str], metadatas: list[dict] | None = None):
+        """
+        add() for async callers. Encoding and storing run in a worker thread, so the
+        event loop keeps running; large batches still overlap the two as in add().
+        """
+        await asyncio.to_thread(self.add, docs, metadatas)
 
-            embedding = self.model.encode([doc]).tolist()
-            self.collection.add(
-                documents=[doc],
-                embeddings=embedding,  # type: ignore
-                ids=[doc_id]
-            )
-            self.debug_print(f"✅ Added: {doc[:50]}...")
+    def _insert(self, ids: list[str], docs: list[str], metadatas: list[dict] | None, embeddings: np.ndarray) -> None:
+        """Store encoded documents and record them in the known IDs and the in-memory copy."""
+        # Chroma takes the float32 array as is, without a list of Python floats per vector
+        self.collection.add(
+            documents=docs,
+            embeddings=embeddings,
+            ids=ids,
+            metadatas=metadatas,
+        )
+        if self._known_ids is not None:
+            self._known_ids.update(ids)
+        if self._mirror:
+            mirror_ids, mirror_docs, mirror_metas, stored = self._mirror
+            if len(mirror_ids) + len(ids) > self.scan_max_docs:
+                self._mirror = False
+            else:
+                self._mirror = (
+                    mirror_ids + ids,
+                    mirror_docs + docs,
+                    mirror_metas + (metadatas if metadatas is not None else [None] * len(ids)),
+                    np.vstack([stored, embeddings]),
+                )
+        if _IS_DEBUG:
+            for doc in docs:
+                self.debug_print(f"✅ Added: {doc[:50]}...")
 
     def query(self, text: str, n_results: int = 3):
         """Query the database with semantic search."""
-        embedding = self.model.encode([text]).tolist()
+        # Repeated queries reuse the embedding instead of running the model again
+        embedding = self._encode_query(text)
+        mirror = self._scan_mirror()
+        if mirror:
+            return self._scan(mirror, embedding[0], n_results)
         results = self.collection.query(
-            query_embeddings=embedding,  # type: ignore
+            query_embeddings=embedding,
             n_results=n_results
         )
         return results
+
+    def _scan_mirror(self) -> tuple | bool:
+        """
+        Load the in-memory copy of the collection on first use, if it is small enough.
+        The copy is reloaded when the collection's count no longer matches it, so rows
+        written by another instance or process are not missed.
+        """
+        if self._mirror and len(self._mirror[0]) != self.collection.count():
+            self._mirror = None
+        if self._mirror is None:
+            if self.scan_max_docs <= 0 or self.collection.count() > self.scan_max_docs:
+                self._mirror = False
+            else:
+                self._mirror = self._load_mirror()
+        return self._mirror
+
+    def _load_mirror(self) -> tuple:
+        """Read the collection into memory, taking embeddings from the FP16 sidecar where it has them."""
+        cached = self._read_sidecar()
+        if cached is None:
+            rows = self.collection.get(include=["documents", "metadatas", "embeddings"])
+            ids = list(rows["ids"])
+            stored = np.asarray(rows["embeddings"], dtype=np.float32).reshape(len(ids), -1) if ids else self._no_embeddings()
+            self._write_sidecar(ids, stored)
+        else:
+            # Only embeddings added since the sidecar was written come from Chroma
+            rows = self.collection.get(include=["documents", "metadatas"])
+            ids = list(rows["ids"])
+            missing = [doc_id for doc_id in ids if doc_id not in cached]
+            for start in range(0, len(missing), _ID_BATCH_SIZE):
+                fetched = self.collection.get(ids=missing[start:start + _ID_BATCH_SIZE], include=["embeddings"])
+                cached.update(zip(fetched["ids"], np.asarray(fetched["embeddings"], dtype=np.float16)))
+            stored = np.array([cached[doc_id] for doc_id in ids], dtype=np.float32) if ids else self._no_embeddings()
+            if missing or len(cached) != len(ids):
+                self._write_sidecar(ids, stored)
+        return (ids, list(rows["documents"]), list(rows["metadatas"]), stored)
+
+    def _no_embeddings(self) -> np.ndarray:
+        return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    def _read_sidecar(self) -> dict | None:
+        """Embeddings by ID from the FP16 sidecar, or None if there is no usable sidecar."""
+        try:
+            with np.load(self._sidecar_path) as data:
+                return dict(zip(data["ids"].tolist(), data["embeddings"]))
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _write_sidecar(self, ids: list[str], embeddings: np.ndarray) -> None:
+        """
+        Save the embeddings as float16 next to the store. Chroma keeps its own copy in
+        float32 only; the half-size sidecar makes rebuilding the in-memory copy cheap.
+        Unit vectors lose under 1e-3 of cosine similarity in float16.
+        """
+        tmp_path = self._sidecar_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, ids=np.array(ids, dtype=str), embeddings=embeddings.astype(np.float16))
+            os.replace(tmp_path, self._sidecar_path)
+        except OSError as e:
+            self.debug_print(f"⚠️ Could not write embedding sidecar: {e}")
+
+    def _scan(self, mirror: tuple, embedding: np.ndarray, n_results: int) -> dict:
+        """Exact nearest-neighbour search over the in-memory copy, in Chroma's query() result shape."""
+        ids, documents, metas, stored = mirror
+        # A float32 BLAS matrix-vector product takes about a millisecond at scan_max_docs
+        # rows, so an int8 SIMD kernel (a compiled extension) would not pay for itself here
+        scores = stored @ embedding  # Cosine similarity, as all embeddings are unit length
+        k = min(n_results, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k] if 0 < k < len(ids) else np.arange(k)
+        top = top[np.argsort(-scores[top])]
+        # Report distances in the collection's own metric, as Chroma would
+        if self.space == "l2":
+            distances = 2.0 - 2.0 * scores[top]  # Squared L2 between unit vectors
+        else:
+            distances = 1.0 - scores[top]
+        return {
+            "ids": [[ids[i] for i in top]],
+            "documents": [[documents[i] for i in top]],
+            "metadatas": [[metas[i] for i in top]],
+            "distances": [distances.tolist()],
+        }
     
     def clear(self) -> None:
         """Clear the entire collection."""
-        self.client.delete_collection(name=self.collection_name)
-        self.collection = self.client.get_or_create_collection(name=self.collection_name)
+        # Deleting the rows keeps the collection and its index settings, rather than
+        # dropping and recreating them; Chroma has no delete-all, so go by ID
+        # The IDs are read fresh from the collection, not from _known(), so rows
+        # added by another process or client are removed too. Each delete shifts
+        # the remaining rows up, so the first page is re-read until it is empty.
+        try:
+            while ids := self.collection.get(include=[], limit=_ID_BATCH_SIZE, offset=0)["ids"]:
+                self.collection.delete(ids=ids)
+        except Exception as e:
+            self.debug_print(f"⚠️ Deleting rows failed, recreating the collection: {e}")
+            self.client.delete_collection(name=self.collection_name)
+            self.collection = self.client.get_or_create_collection(name=self.collection_name, metadata=_HNSW_METADATA)
+            self.space = _HNSW_METADATA["hnsw:space"]
+        self._known_ids = set()
+        self._mirror = None
+        try:
+            os.remove(self._sidecar_path)
+        except FileNotFoundError:
+            pass
         self.debug_print("🗑️ Cleared the vector database.")
\ No newline at end of file